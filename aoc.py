@@ -1,47 +1,553 @@
 # pyright: strict
-from functools import partial
-from os import getenv
+from functools import cache, partial
+from io import BufferedIOBase, TextIOBase
+from os import getenv, stat_result
 from pathlib import Path
-from time import perf_counter_ns
+from time import perf_counter_ns, sleep
 from types import ModuleType
-from typing import IO, Callable, NoReturn, Protocol, cast, runtime_checkable
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Mapping,
+    NamedTuple,
+    NoReturn,
+    Protocol,
+    cast,
+    TYPE_CHECKING,
+    runtime_checkable,
+)
+import re
 import sys
 
+if TYPE_CHECKING:
+    import requests
+
 
 INPUTS_DIR = Path("inputs")
 SESSION_PATH = Path(".sessionid")
 TEMPLATE_PATH = Path("aoc.py.template")
 INPUT_FILE_TEMPLATE = "input_{year}_{puzzle}.txt"
 EXAMPLE_FILE_TEMPLATE = "input_{year}_{puzzle}.example.txt"
+BASE_URL = "https://adventofcode.com"
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_ATTEMPTS = 4
+DOWNLOAD_BACKOFF = 1.0
+CACHE_DIR = INPUTS_DIR / ".cache"
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+PROFILES_DIR = Path("profiles")
+HISTORY_PATH = Path(".history.jsonl")
+SOCKET_PATH = Path(".aoc.sock")
+
+# A puzzle either prints its answers and returns None, or (opt-in) returns or
+# yields `(part, answer)` pairs. When yielding, the time spent before each pair
+# is attributed to that part, so a puzzle can yield e.g. `("parse", None)`,
+# then `(1, answer1)` and `(2, answer2)` to have each phase timed separately.
+Part = int | str
+Answer = int | str | None
+PuzzleFunc = Callable[[IO[str]], Iterable[tuple[Part, Answer]] | None]
+
+# What happens to the puzzle's stdout while it's being timed: "tty" leaves it
+# alone, "buffer" collects it in memory and prints it after the timed section,
+# "discard" throws it away (only counting how much was printed).
+OutputMode = Literal["tty", "buffer", "discard"]
+OUTPUT_MODES: tuple[OutputMode, ...] = ("tty", "buffer", "discard")
+
+# "cpu" runs the puzzle under cProfile, "memory" under tracemalloc
+ProfileKind = Literal["cpu", "memory"]
+
+
+class PartResult(NamedTuple):
+    part: Part
+    answer: Answer
+    run_time: int
+
+
+class PuzzleResult(NamedTuple):
+    day: int
+    year: int
+    example: bool
+    run_time: int
+    parts: tuple[PartResult, ...] = ()
+    output_bytes: int | None = None
 
-PuzzleFunc = Callable[[IO[str]], None]
+    def to_json(self) -> dict[str, object]:
+        return {
+            "day": self.day,
+            "year": self.year,
+            "example": self.example,
+            "run_time_ns": self.run_time,
+            "parts": [
+                {"part": p.part, "answer": p.answer, "run_time_ns": p.run_time}
+                for p in self.parts
+            ],
+            "output_bytes": self.output_bytes,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "PuzzleResult":
+        return cls(
+            day=data["day"],
+            year=data["year"],
+            example=data["example"],
+            run_time=data["run_time_ns"],
+            parts=tuple(
+                PartResult(p["part"], p["answer"], p["run_time_ns"])
+                for p in data["parts"]
+            ),
+            output_bytes=data["output_bytes"],
+        )
 
 
 @runtime_checkable
 class Puzzle(Protocol):
-    def __call__(self, __input: IO[str]) -> None:
+    def __call__(self, __input: IO[str]) -> Iterable[tuple[Part, Answer]] | None:
         ...
 
-    def run_puzzle(self, use_example: bool | None = None) -> None:
+    def run_puzzle(
+        self,
+        use_example: bool | None = None,
+        output: OutputMode = "tty",
+        as_json: bool = False,
+    ) -> PuzzleResult:
         ...
 
+    def bench_puzzle(
+        self,
+        use_example: bool | None = None,
+        repeat: int = 10,
+        warmup: int = 1,
+        disable_gc: bool = False,
+        output: OutputMode = "discard",
+    ) -> None:
+        ...
+
+    def profile_puzzle(
+        self,
+        use_example: bool | None = None,
+        kind: ProfileKind = "cpu",
+        top: int = 20,
+        output: OutputMode = "discard",
+    ) -> Path:
+        ...
+
+
+class _OutputSink(TextIOBase):
+    """Stand-in for sys.stdout that counts (and optionally keeps) the output"""
+
+    def __init__(self, keep: bool, tee: IO[str] | None = None):
+        super().__init__()
+        self.keep = keep
+        self.tee = tee
+        self.chunks: list[str] = []
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        self.bytes_written += len(s.encode())
+        if self.keep:
+            self.chunks.append(s)
+        if self.tee is not None:
+            self.tee.write(s)
+        return len(s)
+
+    def flush(self) -> None:
+        if self.tee is not None:
+            self.tee.flush()
+
+    def getvalue(self) -> str:
+        return "".join(self.chunks)
+
+
+def _call_parts(f: PuzzleFunc, inputs: IO[str]) -> tuple[int, list[PartResult]]:
+    parts: list[PartResult] = []
+    start_time = last_time = perf_counter_ns()
+    answers = f(inputs)
+    if answers is not None:
+        for part, answer in answers:
+            now = perf_counter_ns()
+            parts.append(PartResult(part, answer, now - last_time))
+            last_time = now
+    return perf_counter_ns() - start_time, parts
+
+
+def _call_timed(
+    f: PuzzleFunc, inputs: IO[str], output: OutputMode
+) -> tuple[int, list[PartResult], _OutputSink | None]:
+    if output == "tty":
+        return *_call_parts(f, inputs), None
+
+    from contextlib import redirect_stdout
+
+    sink = _OutputSink(keep=output == "buffer")
+    with redirect_stdout(sink):
+        run_time, parts = _call_parts(f, inputs)
+    return run_time, parts, sink
+
 
 def run_puzzle(
-    day: int, year: int, f: PuzzleFunc, use_example: bool | None = None
-) -> None:
-    print(f"AOC {year} puzzle {day}")
-    print("Getting inputs...", end=" ", flush=True)
+    day: int,
+    year: int,
+    f: PuzzleFunc,
+    use_example: bool | None = None,
+    output: OutputMode = "tty",
+    as_json: bool = False,
+) -> PuzzleResult:
     if use_example is None:
         use_example = bool(getenv("EXAMPLE"))
+
+    if as_json:
+        import json
+
+        # only the JSON document goes to stdout, plus the puzzle output if it
+        # was explicitly requested
+        with get_aoc_input(day, year, use_example=use_example) as inputs:
+            run_time, parts, sink = _call_timed(f, inputs, output)
+        if sink is not None and output == "buffer":
+            sys.stdout.write(sink.getvalue())
+        bytes_written = sink.bytes_written if sink is not None else None
+        result = PuzzleResult(
+            day, year, use_example, run_time, tuple(parts), bytes_written
+        )
+        _record_history("run", output, result)
+        print(json.dumps(result.to_json()))
+        return result
+
+    print(f"AOC {year} puzzle {day}")
+    print("Getting inputs...", end=" ", flush=True)
     with get_aoc_input(day, year, use_example=use_example) as inputs:
         print("done!")
         print("Running puzzle code...")
         print()
-        start_time = perf_counter_ns()
-        f(inputs)
-        run_time = perf_counter_ns() - start_time
+        run_time, parts, sink = _call_timed(f, inputs, output)
+
+    if sink is None:
         print()
         print(f"All done ({run_time / 1000000:g} ms).")
+    elif output == "buffer":
+        start_time = perf_counter_ns()
+        sys.stdout.write(sink.getvalue())
+        sys.stdout.flush()
+        output_time = perf_counter_ns() - start_time
+        print()
+        print(
+            f"All done ({run_time / 1000000:g} ms without output,"
+            f" {(run_time + output_time) / 1000000:g} ms with output;"
+            f" {sink.bytes_written} bytes of output)."
+        )
+    else:
+        print(
+            f"All done ({run_time / 1000000:g} ms;"
+            f" {sink.bytes_written} bytes of output discarded)."
+        )
+
+    if parts:
+        print()
+        for part in parts:
+            answer = "" if part.answer is None else part.answer
+            line = f"{part.part!s:>8}  {part.run_time / 1000000:10.3f} ms  {answer}"
+            print(line.rstrip())
+
+    bytes_written = sink.bytes_written if sink is not None else None
+    result = PuzzleResult(day, year, use_example, run_time, tuple(parts), bytes_written)
+    _record_history("run", output, result)
+    return result
+
+
+def _time_once(
+    day: int,
+    year: int,
+    f: PuzzleFunc,
+    use_example: bool,
+    disable_gc: bool,
+    output: OutputMode,
+) -> tuple[int, list[PartResult], int]:
+    import gc
+
+    with get_aoc_input(day, year, use_example=use_example) as inputs:
+        gc.collect()
+        if disable_gc:
+            gc.disable()
+        try:
+            run_time, parts, sink = _call_timed(f, inputs, output)
+        finally:
+            gc.enable()
+    # buffered output is not interesting to see N times, so it's only counted
+    return run_time, parts, sink.bytes_written if sink is not None else 0
+
+
+def _percentile(sorted_times: list[int], p: float) -> int:
+    # nearest-rank percentile, good enough for a handful of samples
+    index = max(0, min(len(sorted_times) - 1, round(p * len(sorted_times)) - 1))
+    return sorted_times[index]
+
+
+def bench_puzzle(
+    day: int,
+    year: int,
+    f: PuzzleFunc,
+    use_example: bool | None = None,
+    repeat: int = 10,
+    warmup: int = 1,
+    disable_gc: bool = False,
+    output: OutputMode = "discard",
+) -> None:
+    from statistics import fmean, median, pstdev
+
+    print(f"AOC {year} puzzle {day} (benchmark)")
+    if use_example is None:
+        use_example = bool(getenv("EXAMPLE"))
+    # make sure the input is available before timing anything
+    get_aoc_input(day, year, use_example=use_example).close()
+
+    def run_once() -> tuple[int, list[PartResult], int]:
+        return _time_once(day, year, f, use_example, disable_gc, output)
+
+    for _ in range(warmup):
+        run_once()
+    runs = [run_once() for _ in range(repeat)]
+    times = sorted(run_time for run_time, _, _ in runs)
+
+    def ms(ns: float) -> str:
+        return f"{ns / 1000000:.3f} ms"
+
+    mean = fmean(times)
+    print()
+    gc_state = "off" if disable_gc else "on"
+    print(f"runs:    {repeat} (after {warmup} warmup, gc {gc_state})")
+    print(f"min:     {ms(times[0])}")
+    print(f"median:  {ms(median(times))}")
+    print(f"p95:     {ms(_percentile(times, 0.95))}")
+    print(f"max:     {ms(times[-1])}")
+    print(f"stddev:  {ms(pstdev(times))}")
+    print(f"ops/sec: {1000000000 / mean:g}")
+    if output != "tty":
+        print(f"output:  {runs[-1][2]} bytes per run ({output})")
+
+    # the best time of each part is recorded, like the best total time
+    best_parts: dict[Part, PartResult] = {}
+    for _, parts, _ in runs:
+        for part in parts:
+            best = best_parts.get(part.part)
+            if best is None or part.run_time < best.run_time:
+                best_parts[part.part] = part
+    result = PuzzleResult(
+        day, year, use_example, times[0], tuple(best_parts.values()), runs[-1][2]
+    )
+    stats = {
+        "repeat": repeat,
+        "warmup": warmup,
+        "gc": not disable_gc,
+        "min_ns": times[0],
+        "median_ns": median(times),
+        "p95_ns": _percentile(times, 0.95),
+        "stddev_ns": pstdev(times),
+    }
+    _record_history("bench", output, result, stats)
+
+
+def _git_revision() -> str | None:
+    from subprocess import DEVNULL, PIPE, run
+
+    try:
+        commit = run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=PIPE,
+            stderr=DEVNULL,
+            encoding="utf-8",
+        ).stdout.strip()
+        changes = run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            stdout=PIPE,
+            stderr=DEVNULL,
+            encoding="utf-8",
+        ).stdout.strip()
+    except OSError:
+        return None
+    if not commit:
+        return None
+    return f"{commit}+dirty" if changes else commit
+
+
+def _platform() -> tuple[str, str]:
+    import platform
+
+    python = f"{platform.python_implementation()} {platform.python_version()}"
+    machine = f"{platform.node()} {platform.machine()}"
+    return python, machine
+
+
+def _record_history(
+    kind: str,
+    output: OutputMode,
+    result: PuzzleResult,
+    stats: Mapping[str, object] | None = None,
+):
+    import json
+    from datetime import datetime, timezone
+
+    python, machine = _platform()
+    record: dict[str, object] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "kind": kind,
+        "day": result.day,
+        "year": result.year,
+        "example": result.example,
+        "output": output,
+        "run_time_ns": result.run_time,
+        "parts": {str(p.part): p.run_time for p in result.parts},
+        "environment": _puzzle_environment(result.day),
+        "commit": _git_revision(),
+        "python": python,
+        "machine": machine,
+    }
+    if stats is not None:
+        record["stats"] = stats
+    # a single short write in append mode, so concurrent batch workers don't
+    # interleave their lines
+    with HISTORY_PATH.open("a") as history:
+        history.write(json.dumps(record) + "\n")
+
+
+def _load_history() -> list[dict[str, Any]]:
+    import json
+
+    try:
+        with HISTORY_PATH.open() as history:
+            return [json.loads(line) for line in history if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def report(days: range, threshold: float = 0.1, last: int = 5) -> bool:
+    """
+    Print timing trends for each day, comparing the best time for each commit
+    (on this machine and Python version) with the previous one.
+
+    Returns True if any regression beyond `threshold` (a fraction) was found.
+
+    """
+    python, machine = _platform()
+    print(f"Timing history for {machine}, {python}")
+    print(f"(best time per commit, regressions above {threshold:.0%} are flagged)")
+
+    # (day, output mode, options) -> commit -> label ("total" or part) -> best time
+    best: dict[tuple[int, str, str], dict[str, dict[str, int]]] = {}
+    for record in _load_history():
+        if record["day"] not in days or record["example"]:
+            continue
+        if record["python"] != python or record["machine"] != machine:
+            continue
+        # (runs with different DAY<DAY>_* options, e.g. another solver, aren't
+        # compared with each other)
+        environment = record.get("environment", {})
+        options = " ".join(f"{name}={value}" for name, value in environment.items())
+        # dicts keep insertion order, so commits stay in chronological order
+        key = (record["day"], record["output"], options)
+        by_commit = best.setdefault(key, {})
+        times = by_commit.setdefault(record["commit"] or "?", {})
+        labels = [("total", record["run_time_ns"]), *record["parts"].items()]
+        for label, run_time in labels:
+            times[label] = min(times.get(label, run_time), run_time)
+
+    regressions: list[str] = []
+    for (day, output, options), by_commit in sorted(best.items()):
+        print()
+        print(f"day {day} ({output} output{', ' + options if options else ''})")
+        commits = list(by_commit.items())[-last:]
+        previous: dict[str, int] = {}
+        for commit, times in commits:
+            line = f"  {commit:>14}"
+            for label, run_time in times.items():
+                line += f"  {label}: {run_time / 1000000:.3f} ms"
+                old = previous.get(label)
+                if old:
+                    change = (run_time - old) / old
+                    line += f" ({change:+.1%})"
+                    if change > threshold and commit == commits[-1][0]:
+                        line += " REGRESSION"
+                        what = label if label == "total" else f"part {label}"
+                        if options:
+                            what += f" [{options}]"
+                        regressions.append(f"day {day} {what} ({change:+.1%})")
+            print(line)
+            previous = times
+
+    print()
+    if regressions:
+        print("Regressions: " + ", ".join(regressions))
+    elif best:
+        print("No regressions.")
+    else:
+        print("No history recorded yet.")
+    return bool(regressions)
+
+
+def profile_puzzle(
+    day: int,
+    year: int,
+    f: PuzzleFunc,
+    use_example: bool | None = None,
+    kind: ProfileKind = "cpu",
+    top: int = 20,
+    output: OutputMode = "discard",
+) -> Path:
+    print(f"AOC {year} puzzle {day} ({kind} profile)")
+    if use_example is None:
+        use_example = bool(getenv("EXAMPLE"))
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    suffix = ".example" if use_example else ""
+
+    if kind == "cpu":
+        from cProfile import Profile
+        from pstats import Stats
+
+        profile_path = PROFILES_DIR / f"day{day}{suffix}.pstats"
+        profiler = Profile()
+        with get_aoc_input(day, year, use_example=use_example) as inputs:
+            run_time, _, _ = profiler.runcall(_call_timed, f, inputs, output)
+        profiler.dump_stats(profile_path)
+        print(f"Profiled run took {run_time / 1000000:g} ms.")
+        print()
+        Stats(profiler).sort_stats("cumulative").print_stats(top)
+    else:
+        import tracemalloc
+
+        profile_path = PROFILES_DIR / f"day{day}{suffix}.tracemalloc"
+        with get_aoc_input(day, year, use_example=use_example) as inputs:
+            tracemalloc.start()
+            try:
+                run_time, _, _ = _call_timed(f, inputs, output)
+                _, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+            finally:
+                tracemalloc.stop()
+        snapshot.dump(str(profile_path))
+        print(f"Profiled run took {run_time / 1000000:g} ms.")
+        print(f"Peak traced memory: {peak / 1024:.1f} KiB")
+        print()
+        print(f"Top {top} allocation sites still alive at the end of the run:")
+        snapshot = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            print(
+                f"{stat.size / 1024:10.1f} KiB {stat.count:8} blocks"
+                f"  {frame.filename}:{frame.lineno}"
+            )
+
+    print()
+    print(f"Profile saved to {profile_path}")
+    return profile_path
 
 
 def puzzle(f: PuzzleFunc) -> Puzzle:
@@ -58,6 +564,8 @@ def puzzle(f: PuzzleFunc) -> Puzzle:
     del caller
     day, year = _get_day_and_year_from_path(path)
     f.run_puzzle = partial(run_puzzle, day, year, f)  # type: ignore
+    f.bench_puzzle = partial(bench_puzzle, day, year, f)  # type: ignore
+    f.profile_puzzle = partial(profile_puzzle, day, year, f)  # type: ignore
     return cast(Puzzle, f)
 
 
@@ -105,28 +613,121 @@ def _download_aoc_input(day: int, year: int, path: Path) -> IO[str]:
     # weirdly modularization, don't care about fixing the mess now. point for
     # now is only to contain code that imports `requests` so we don't need to
     # import it every time and we don't hard-fail if it's not available.
+    base_url = _base_url()
+    with _new_session() as session:
+        _fetch_to_file(session, _input_url(day, year, base_url), path, base_url)
+    return path.open("r")
+
+
+def _base_url() -> str:
+    # can be pointed to a local server for testing
+    return getenv("AOC_BASE_URL", BASE_URL).rstrip("/")
+
+
+def _input_url(day: int, year: int, base_url: str) -> str:
+    return f"{base_url}/{year}/day/{day}/input"
+
+
+def _new_session(pool_size: int = 1) -> "requests.Session":
     import requests
+    from requests.adapters import HTTPAdapter
 
-    def get_aoc_url(url: str) -> requests.Response:
-        _check_aoc_url(url)
-        cookies = get_cookies()
-        return requests.get(url, cookies=cookies)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.cookies.update(get_cookies())
+    return session
+
+
+def _fetch_to_file(session: "requests.Session", url: str, path: Path, base_url: str):
+    import requests
+
+    _check_aoc_url(url, base_url)
+    delay = DOWNLOAD_BACKOFF
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        try:
+            response = session.get(url, timeout=DOWNLOAD_TIMEOUT)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+        else:
+            # only server-side errors are worth retrying; e.g. 404 for puzzles
+            # not unlocked yet, or 400 for an expired session, are final
+            retry = response.status_code == 429 or response.status_code >= 500
+            if not retry or attempt == DOWNLOAD_ATTEMPTS:
+                response.raise_for_status()
+                _write_atomic(path, response.content)
+                return
+        sleep(delay)
+        delay *= 2
+    raise Exception(f"could not download {url} in {DOWNLOAD_ATTEMPTS} attempts")
+
+
+def _write_atomic(path: Path, content: bytes):
+    # never leave a truncated input file behind, or it would be used as-is
+    from os import replace, unlink
+    from tempfile import NamedTemporaryFile
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(
+        dir=path.parent, prefix=f".{path.name}.", delete=False
+    ) as tmp:
+        try:
+            tmp.write(content)
+        except BaseException:
+            tmp.close()
+            unlink(tmp.name)
+            raise
+    replace(tmp.name, path)
 
-    url = f"https://adventofcode.com/{year}/day/{day}/input"
-    response = get_aoc_url(url)
-    response.raise_for_status()
-    path.write_bytes(response.content)
-    return path.open("r")
 
+def _fetch_all(days: range, year: int, jobs: int = 4, base_url: str | None = None):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    if base_url is None:
+        base_url = _base_url()
+    missing = [
+        (day, path)
+        for day in days
+        if not (path := _input_file_path(day, year, example=False)).is_file()
+    ]
+    if not missing:
+        print("All inputs are already there.")
+        return
 
-def _check_aoc_url(url: str):
+    print(f"Downloading {len(missing)} inputs...")
+    failed: list[int] = []
+    with _new_session(pool_size=jobs) as session, ThreadPoolExecutor(jobs) as pool:
+        futures = {
+            pool.submit(
+                _fetch_to_file, session, _input_url(day, year, base_url), path, base_url
+            ): (day, path)
+            for day, path in missing
+        }
+        for future in as_completed(futures):
+            day, path = futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"day {day:2}  FAILED: {exc}", file=sys.stderr)
+                failed.append(day)
+            else:
+                print(f"day {day:2}  {path}")
+    if failed:
+        sys.exit(1)
+
+
+def _check_aoc_url(url: str, base_url: str = BASE_URL):
     from urllib.parse import urlparse
 
     parsed = urlparse(url)
-    if parsed.scheme != "https" and parsed.netloc != "adventofcode.com":
-        raise Exception(f"URL is not from https://adventofcode.com/: {url!r}")
+    base = urlparse(base_url)
+    if (parsed.scheme, parsed.netloc) != (base.scheme, base.netloc):
+        raise Exception(f"URL is not from {base_url}: {url!r}")
 
 
+@cache
 def get_cookies() -> dict[str, str]:
     session = SESSION_PATH.read_text().strip()
     return {"session": session}
@@ -221,38 +822,740 @@ def _load_path(path: Path) -> ModuleType:
     return module
 
 
-def _run(day: int, year: int, path: Path, use_example: bool | None):
+# modules loaded by _find_puzzle, with the mtime of their file at load time, so
+# a long-running process (see `serve`) only re-executes the ones that changed
+_loaded_modules: dict[Path, tuple[int, ModuleType]] = {}
+
+
+def _load_path_cached(path: Path) -> ModuleType:
+    mtime = path.stat().st_mtime_ns
+    try:
+        loaded_mtime, module = _loaded_modules[path]
+    except KeyError:
+        pass
+    else:
+        if loaded_mtime == mtime:
+            return module
+    module = _load_path(path)
+    _loaded_modules[path] = mtime, module
+    return module
+
+
+def _find_puzzle(path: Path) -> Puzzle:
+    module = _load_path_cached(path)
+    for obj in module.__dict__.values():
+        if isinstance(obj, Puzzle):
+            return obj
+    print(f"{path} does not have any @puzzle-decorate function.", file=sys.stderr)
+    sys.exit(1)
+
+
+def _file_digest(path: Path) -> str:
+    from hashlib import sha256
+
+    return sha256(path.read_bytes()).hexdigest()
+
+
+def _is_puzzle_variable(name: str) -> bool:
+    # DAY<DAY>_* environment variables are options of a puzzle (e.g. which
+    # solver to use), read when it runs
+    day, _, option = name.removeprefix("DAY").partition("_")
+    return day.isdigit() and bool(option)
+
+
+def _puzzle_environment(day: int | None = None) -> dict[str, str]:
+    """The DAY<DAY>_* environment variables, of one day or of all of them"""
+    from os import environ
+
+    return {
+        name: value
+        for name, value in sorted(environ.items())
+        if _is_puzzle_variable(name)
+        and (day is None or name.startswith(f"DAY{day}_"))
+    }
+
+
+def puzzle_option(name: str, *choices: str) -> str:
+    """
+    The value of the DAY<DAY>_* environment variable `name`, which must be one
+    of `choices` (the first one is the default)
+
+    """
+    value = getenv(name, choices[0])
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}, not {value!r}")
+    return value
+
+
+def _cache_key(
+    path: Path, day: int, year: int, use_example: bool, variant: str
+) -> str | None:
+    import json
+    from hashlib import sha256
+
+    input_path = _input_file_path(day, year, example=use_example)
+    if not input_path.is_file():
+        # will be downloaded, so there's nothing to hash yet
+        return None
+    # (the options of the puzzle can change its result too)
+    variant += " " + json.dumps(_puzzle_environment(day))
+    key = sha256(variant.encode())
+    for p in (path, Path(__file__), input_path):
+        key.update(bytes.fromhex(_file_digest(p)))
+    return key.hexdigest()
+
+
+def _local_helper_modules(directory: Path) -> Iterator[tuple[str, Path]]:
+    # modules imported from the puzzle directory, other than aoc.py itself and
+    # the dayN.py modules
+    for name, module in list(sys.modules.items()):
+        file_name = getattr(module, "__file__", None)
+        if not file_name:
+            continue
+        path = Path(file_name).absolute()
+        if path.parent != directory or path.suffix != ".py":
+            continue
+        if path.name == Path(__file__).name:
+            continue
+        if path.name.removeprefix("day").removesuffix(".py").isdigit():
+            continue
+        yield name, path
+
+
+def _local_dependencies(path: Path) -> dict[str, str]:
+    # helper modules imported by the puzzle can change its result, so their
+    # digests are part of the cache entry too
+    return {
+        dep.name: _file_digest(dep)
+        for _, dep in _local_helper_modules(path.absolute().parent)
+    }
+
+
+def _cache_load(key: str, path: Path) -> tuple[str, PuzzleResult | None] | None:
+    import json
+    from os import utime
+
+    entry_path = CACHE_DIR / f"{key}.json"
+    try:
+        entry = json.loads(entry_path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    directory = path.absolute().parent
+    for name, digest in entry["deps"].items():
+        dep = directory / name
+        if not dep.is_file() or _file_digest(dep) != digest:
+            return None
+    # mtime is the "last used" timestamp for LRU eviction
+    utime(entry_path)
+    result = entry["result"]
+    if result is not None:
+        result = PuzzleResult.from_json(result)
+    return entry["output"], result
+
+
+def _cache_store(key: str, path: Path, output: str, result: PuzzleResult | None):
+    import json
+    from os import replace
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    entry = {
+        "deps": _local_dependencies(path),
+        "output": output,
+        "result": result.to_json() if result is not None else None,
+    }
+    entry_path = CACHE_DIR / f"{key}.json"
+    tmp_path = entry_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(entry))
+    replace(tmp_path, entry_path)
+    _cache_evict(CACHE_MAX_BYTES)
+
+
+def _cache_evict(max_bytes: int):
+    entries: list[tuple[stat_result, Path]] = []
+    for entry_path in CACHE_DIR.glob("*.json"):
+        try:
+            entries.append((entry_path.stat(), entry_path))
+        except FileNotFoundError:
+            # evicted by another worker in the meantime
+            pass
+    entries.sort(key=lambda e: e[0].st_mtime, reverse=True)
+    total = 0
+    for stat, entry_path in entries:
+        total += stat.st_size
+        if total > max_bytes:
+            entry_path.unlink(missing_ok=True)
+
+
+def _run(
+    day: int,
+    year: int,
+    path: Path,
+    use_example: bool | None,
+    output: OutputMode = "tty",
+    as_json: bool = False,
+    use_cache: bool = True,
+):
     if path.is_file():
-        module = _load_path(path)
-        for obj in module.__dict__.values():
-            if isinstance(obj, Puzzle):
-                callable = obj
-                break
-        else:
-            print(
-                f"{path} does not have any @puzzle-decorate function.", file=sys.stderr
-            )
-            sys.exit(1)
-        callable.run_puzzle(use_example)
+        if use_example is None:
+            use_example = bool(getenv("EXAMPLE"))
+        variant = f"run {output} {as_json}"
+        key = _cache_key(path, day, year, use_example, variant) if use_cache else None
+        if key is not None:
+            cached = _cache_load(key, path)
+            if cached is not None:
+                sys.stdout.write(cached[0])
+                print("(cached result, use --no-cache to run again)", file=sys.stderr)
+                return
+
+        from contextlib import redirect_stdout
+
+        sink = _OutputSink(keep=use_cache, tee=sys.stdout)
+        with redirect_stdout(sink):
+            result = _find_puzzle(path).run_puzzle(use_example, output, as_json)
+        if use_cache:
+            key = key or _cache_key(path, day, year, use_example, variant)
+            if key is not None:
+                _cache_store(key, path, sink.getvalue(), result)
     else:
         _create_from_template(path, day, year)
         print(f"{path} created from template. Run command again to run puzzle.")
 
 
+class BatchResult(NamedTuple):
+    day: int
+    status: int
+    wall_time: int
+    output: str
+    result: PuzzleResult | None = None
+    cached: bool = False
+
+    def to_json(self) -> dict[str, object]:
+        return {
+            "day": self.day,
+            "status": self.status,
+            "wall_time_ns": self.wall_time,
+            "cached": self.cached,
+            "result": self.result.to_json() if self.result is not None else None,
+        }
+
+
+def _run_captured(
+    path: Path, day: int, year: int, use_example: bool | None, use_cache: bool
+) -> BatchResult:
+    # runs in a worker process: everything the puzzle prints is collected and
+    # sent back to the parent together with the exit status
+    from contextlib import redirect_stderr, redirect_stdout
+    from io import StringIO
+    from traceback import print_exc
+
+    start_time = perf_counter_ns()
+    if use_example is None:
+        use_example = bool(getenv("EXAMPLE"))
+    key = _cache_key(path, day, year, use_example, "batch") if use_cache else None
+    if key is not None:
+        cached = _cache_load(key, path)
+        if cached is not None:
+            wall_time = perf_counter_ns() - start_time
+            return BatchResult(day, 0, wall_time, *cached, cached=True)
+
+    output = StringIO()
+    status = 0
+    result = None
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            result = _find_puzzle(path).run_puzzle(use_example)
+        except SystemExit as exc:
+            status = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            print_exc()
+            status = 1
+    wall_time = perf_counter_ns() - start_time
+    if use_cache and status == 0:
+        key = key or _cache_key(path, day, year, use_example, "batch")
+        if key is not None:
+            _cache_store(key, path, output.getvalue(), result)
+    return BatchResult(day, status, wall_time, output.getvalue(), result)
+
+
+def _parse_days(spec: str) -> range:
+    if spec == "all":
+        return range(1, 26)
+    first, sep, last = spec.partition("-")
+    if not sep:
+        raise ValueError(f"not a range of days: {spec!r}")
+    days = range(int(first), int(last) + 1)
+    if not days or days.start < 1 or days.stop > 26:
+        raise ValueError(f"{spec} is not a valid range of days for AOC")
+    return days
+
+
+def _discover_puzzles(days: range) -> list[tuple[Path, int, int]]:
+    found: list[tuple[Path, int, int]] = []
+    for day in days:
+        path, day, year = path_for_puzzle(day)
+        if path.is_file():
+            found.append((path, day, year))
+    return found
+
+
+def _run_batch(
+    days: range,
+    use_example: bool | None,
+    jobs: int | None = None,
+    verbose: bool = False,
+    as_json: bool = False,
+    use_cache: bool = True,
+):
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    puzzles = _discover_puzzles(days)
+    if not puzzles:
+        print(f"No puzzles found for days {days.start}-{days.stop - 1}.")
+        sys.exit(1)
+
+    # with --json nothing but the JSON document is printed on stdout
+    log = partial(print, file=sys.stderr if as_json else sys.stdout)
+
+    log(f"Running {len(puzzles)} puzzles...")
+    log()
+    results: list[BatchResult] = []
+    start_time = perf_counter_ns()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(_run_captured, path, day, year, use_example, use_cache)
+            for path, day, year in puzzles
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            outcome = "ok" if result.status == 0 else f"FAILED ({result.status})"
+            if result.cached:
+                outcome += " (cached)"
+            wall_time_ms = result.wall_time / 1000000
+            line = f"day {result.day:2}  {wall_time_ms:10.3f} ms  {outcome}"
+            if result.result is not None:
+                for p in result.result.parts:
+                    if p.answer is not None:
+                        line += f"  {p.part}: {p.answer}"
+            log(line)
+    run_time = perf_counter_ns() - start_time
+
+    results.sort(key=lambda r: r.day)
+    for result in results:
+        if verbose or result.status != 0:
+            log()
+            log(f"======= day {result.day} output =======")
+            log(result.output, end="")
+
+    failed = [r.day for r in results if r.status != 0]
+    total = sum(r.wall_time for r in results)
+    log()
+    log(f"All done ({run_time / 1000000:g} ms, {total / 1000000:g} ms of puzzle time).")
+    if as_json:
+        import json
+
+        print(json.dumps([r.to_json() for r in results], indent=2))
+    if failed:
+        print(f"Failed: {', '.join(f'day {day}' for day in failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+def _pop_option(args: list[str], name: str) -> str | None:
+    # tiny helper for `--name value` style options, removed from `args` in place
+    try:
+        index = args.index(name)
+    except ValueError:
+        return None
+    try:
+        value = args[index + 1]
+    except IndexError:
+        _usage()
+    del args[index : index + 2]
+    return value
+
+
+def _pop_flag(args: list[str], *names: str) -> bool:
+    found = False
+    for name in names:
+        while name in args:
+            args.remove(name)
+            found = True
+    return found
+
+
+def _pop_output_mode(args: list[str], default: OutputMode) -> OutputMode:
+    mode = _pop_option(args, "--output")
+    if _pop_flag(args, "-q", "--quiet"):
+        mode = "discard"
+    if mode is None:
+        return default
+    for valid_mode in OUTPUT_MODES:
+        if mode == valid_mode:
+            return valid_mode
+    _usage()
+
+
+def _bench(path: Path, use_example: bool | None, args: list[str]):
+    if not path.is_file():
+        print(f"{path} does not exist.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        repeat = int(_pop_option(args, "--repeat") or 10)
+        warmup = int(_pop_option(args, "--warmup") or 1)
+    except ValueError:
+        _usage()
+    disable_gc = _pop_flag(args, "--no-gc")
+    output = _pop_output_mode(args, default="discard")
+    if repeat < 1 or warmup < 0:
+        _usage()
+    _find_puzzle(path).bench_puzzle(use_example, repeat, warmup, disable_gc, output)
+
+
+def _profile(
+    path: Path, use_example: bool | None, kind: ProfileKind, args: list[str]
+):
+    if not path.is_file():
+        print(f"{path} does not exist.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        top = int(_pop_option(args, "--top") or 20)
+    except ValueError:
+        _usage()
+    output = _pop_output_mode(args, default="discard")
+    _find_puzzle(path).profile_puzzle(use_example, kind, top, output)
+
+
 def _usage() -> NoReturn:
     print("usage:")
     print(f"  python {sys.argv[0]} <PUZZLE_DAY>", file=sys.stderr)
     print(f"  python {sys.argv[0]} <PUZZLE_DAY> edit", file=sys.stderr)
     print(f"  python {sys.argv[0]} <PUZZLE_DAY> edit-example", file=sys.stderr)
-    print(f"  python {sys.argv[0]} <PUZZLE_DAY> run", file=sys.stderr)
+    print(
+        f"  python {sys.argv[0]} <PUZZLE_DAY> run|run-example"
+        " [--output tty|buffer|discard] [-q] [--json] [--no-cache]",
+        file=sys.stderr,
+    )
     print(f"  python {sys.argv[0]} <PUZZLE_DAY> commit", file=sys.stderr)
+    print(
+        f"  python {sys.argv[0]} <PUZZLE_DAY> bench|bench-example"
+        " [--repeat N] [--warmup N] [--no-gc] [--output tty|buffer|discard]",
+        file=sys.stderr,
+    )
+    print(
+        f"  python {sys.argv[0]} <PUZZLE_DAY> watch|watch-example"
+        " [--interval SECONDS] [--output tty|buffer|discard]",
+        file=sys.stderr,
+    )
+    print(
+        f"  python {sys.argv[0]} <PUZZLE_DAY> profile|memprofile"
+        " [--top N] [--output tty|buffer|discard]",
+        file=sys.stderr,
+    )
+    print(
+        f"  python {sys.argv[0]} all|<FIRST>-<LAST> [run|run-example]"
+        " [--jobs N] [-v] [--json] [--no-cache]",
+        file=sys.stderr,
+    )
+    print(
+        f"  python {sys.argv[0]} fetch-all [all|<FIRST>-<LAST>]"
+        " [--jobs N] [--base-url URL]",
+        file=sys.stderr,
+    )
+    print(
+        f"  python {sys.argv[0]} report [all|<PUZZLE_DAY>|<FIRST>-<LAST>]"
+        " [--threshold PERCENT] [--last N]",
+        file=sys.stderr,
+    )
+    print(f"  python {sys.argv[0]} serve", file=sys.stderr)
+    print(f"  python {sys.argv[0]} remote <ARGS...>", file=sys.stderr)
     sys.exit(1)
 
 
-def main():
+class _MessageWriter(TextIOBase):
+    """Text stream sending each write to a `remote` client as a JSON message"""
+
+    def __init__(self, stream: BufferedIOBase, name: str):
+        super().__init__()
+        self.stream = stream
+        self.name = name
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        import json
+
+        try:
+            self.stream.write(json.dumps({self.name: s}).encode() + b"\n")
+        except BrokenPipeError:
+            # client went away, but let the puzzle finish anyway
+            pass
+        return len(s)
+
+
+def _remember_helpers(directory: Path, mtimes: dict[str, int]):
+    # called right after running puzzles, so that the helpers they imported
+    # are known with the mtime of the file they were loaded from
+    for name, path in _local_helper_modules(directory):
+        mtimes.setdefault(name, path.stat().st_mtime_ns)
+
+
+def _forget_changed_helpers(directory: Path, mtimes: dict[str, int]):
+    # helper modules are imported normally by the puzzles, so when one changed
+    # since _remember_helpers() it's dropped from sys.modules, and every puzzle
+    # is loaded again
+    for name, path in _local_helper_modules(directory):
+        if name in mtimes and mtimes[name] != path.stat().st_mtime_ns:
+            del sys.modules[name]
+            del mtimes[name]
+            _loaded_modules.clear()
+
+
+def _serve(socket_path: Path):
+    import json
+    from contextlib import redirect_stderr, redirect_stdout
+    from os import environ
+    from socketserver import StreamRequestHandler, UnixStreamServer
+    from traceback import print_exc
+
+    directory = Path().absolute()
+    helper_mtimes: dict[str, int] = {}
+
+    class Handler(StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            argv: list[str] = request["argv"]
+            print(f"> {' '.join(argv)}")
+            stdout = _MessageWriter(self.wfile, "stdout")
+            stderr = _MessageWriter(self.wfile, "stderr")
+            status = 0
+            _forget_changed_helpers(directory, helper_mtimes)
+            environ.pop("EXAMPLE", None)
+            if request.get("example"):
+                environ["EXAMPLE"] = request["example"]
+            # the client's puzzle options replace the ones of the last request
+            for name in _puzzle_environment():
+                del environ[name]
+            environ.update(request.get("environment", {}))
+            start_time = perf_counter_ns()
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                try:
+                    unsupported = argv[:1] in (["serve"], ["remote"]) or any(
+                        action.startswith(("edit", "watch")) for action in argv[1:2]
+                    )
+                    if unsupported:
+                        print("not supported by the server", file=sys.stderr)
+                        status = 1
+                    else:
+                        main(argv)
+                except SystemExit as exc:
+                    status = exc.code if isinstance(exc.code, int) else 1
+                except Exception:
+                    print_exc()
+                    status = 1
+            _remember_helpers(directory, helper_mtimes)
+            run_time = perf_counter_ns() - start_time
+            print(f"  exit status {status} ({run_time / 1000000:g} ms)")
+            try:
+                self.wfile.write(json.dumps({"exit": status}).encode() + b"\n")
+            except BrokenPipeError:
+                pass
+
+    if socket_path.exists():
+        socket_path.unlink()
+    with UnixStreamServer(str(socket_path), Handler) as server:
+        print(f"Listening on {socket_path} (Ctrl-C to stop)...")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def _remote(socket_path: Path, argv: list[str]) -> NoReturn:
+    import json
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(
+                "No server is running (start one with `python aoc.py serve`).",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        request = {
+            "argv": argv,
+            "example": getenv("EXAMPLE"),
+            "environment": _puzzle_environment(),
+        }
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        status = 1
+        with sock.makefile("rb") as stream:
+            for line in stream:
+                message = json.loads(line)
+                if "stdout" in message:
+                    sys.stdout.write(message["stdout"])
+                elif "stderr" in message:
+                    sys.stderr.write(message["stderr"])
+                elif "exit" in message:
+                    status = message["exit"]
+    sys.exit(status)
+
+
+def _format_delta(new: int, old: int) -> str:
+    delta = new - old
+    percent = f", {delta / old:+.1%}" if old else ""
+    return f"{new / 1000000:.3f} ms ({delta / 1000000:+.3f} ms{percent})"
+
+
+def _report_changes(result: PuzzleResult, previous: PuzzleResult | None):
+    if previous is None:
+        return
+    print()
+    print("Compared to previous run:")
+    print(f"{'total':>8}  {_format_delta(result.run_time, previous.run_time)}")
+    previous_parts = {p.part: p for p in previous.parts}
+    for part in result.parts:
+        try:
+            old = previous_parts[part.part]
+        except KeyError:
+            continue
+        line = f"{part.part!s:>8}  {_format_delta(part.run_time, old.run_time)}"
+        if part.answer != old.answer:
+            line += f"  answer changed (was {old.answer})"
+        print(line)
+
+
+def _watch(
+    day: int,
+    year: int,
+    path: Path,
+    use_example: bool | None,
+    output: OutputMode = "tty",
+    interval: float = 0.5,
+):
+    from traceback import print_exc
+
+    if not path.is_file():
+        print(f"{path} does not exist.", file=sys.stderr)
+        sys.exit(1)
+
+    directory = path.absolute().parent
+    helper_mtimes: dict[str, int] = {}
+    inputs = [
+        _input_file_path(day, year, example=False),
+        _input_file_path(day, year, example=True),
+    ]
+
+    def get_mtimes() -> dict[Path, int | None]:
+        watched = [path, *inputs, *(p for _, p in _local_helper_modules(directory))]
+        mtimes: dict[Path, int | None] = {}
+        for p in watched:
+            try:
+                mtimes[p] = p.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtimes[p] = None
+        return mtimes
+
+    previous: PuzzleResult | None = None
+    last_mtimes = None
+    try:
+        while True:
+            mtimes = get_mtimes()
+            if mtimes != last_mtimes:
+                _forget_changed_helpers(directory, helper_mtimes)
+                try:
+                    result = _find_puzzle(path).run_puzzle(use_example, output)
+                except (Exception, SystemExit):
+                    print_exc()
+                else:
+                    _report_changes(result, previous)
+                    previous = result
+                # helpers imported for the first time are watched from now on
+                _remember_helpers(directory, helper_mtimes)
+                last_mtimes = get_mtimes()
+                print()
+                print(f"Watching {path} and its inputs for changes (Ctrl-C to stop)...")
+                print()
+            sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+
+def _report(args: list[str]):
+    try:
+        threshold = float(_pop_option(args, "--threshold") or 10) / 100
+        last = int(_pop_option(args, "--last") or 5)
+        spec = args[1] if len(args) > 1 else "all"
+        days = range(int(spec), int(spec) + 1) if spec.isdigit() else _parse_days(spec)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        sys.exit(1)
+    if report(days, threshold, last):
+        sys.exit(1)
+
+
+def _get_action(args: list[str]) -> str:
+    # the command is optional, so `python aoc.py 12 -q` means `12 run -q`
+    if len(args) > 1 and not args[1].startswith("-"):
+        return args[1]
+    return "run"
+
+
+def main(argv: list[str] | None = None):
+    args = sys.argv[1:] if argv is None else [*argv]
     try:
-        puzzle = int(sys.argv[1])
-    except (ValueError, IndexError):
+        first = args[0]
+    except IndexError:
+        _usage()
+
+    if first == "fetch-all":
+        jobs = _pop_option(args, "--jobs")
+        base_url = _pop_option(args, "--base-url")
+        try:
+            days = _parse_days(args[1] if len(args) > 1 else "all")
+            max_workers = int(jobs) if jobs is not None else 4
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            sys.exit(1)
+        _, _, year = path_for_puzzle(days.start)
+        _fetch_all(days, year, max_workers, base_url)
+        return
+    if first == "report":
+        _report(args)
+        return
+    if first == "serve":
+        _serve(SOCKET_PATH)
+        return
+    if first == "remote":
+        _remote(SOCKET_PATH, args[1:])
+
+    if first == "all" or re.fullmatch(r"\d+-\d+", first, re.ASCII):
+        jobs = _pop_option(args, "--jobs")
+        verbose = _pop_flag(args, "-v", "--verbose")
+        as_json = _pop_flag(args, "--json")
+        use_cache = not _pop_flag(args, "--no-cache")
+        try:
+            days = _parse_days(first)
+            max_workers = int(jobs) if jobs is not None else None
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            sys.exit(1)
+        action = _get_action(args)
+        if action == "run":
+            _run_batch(days, None, max_workers, verbose, as_json, use_cache)
+        elif action == "run-example":
+            _run_batch(days, True, max_workers, verbose, as_json, use_cache)
+        else:
+            _usage()
+        return
+
+    try:
+        puzzle = int(first)
+    except ValueError:
         _usage()
 
     if not 1 <= puzzle <= 25:
@@ -261,15 +1564,30 @@ def main():
 
     path, day, year = path_for_puzzle(puzzle)
 
-    try:
-        action = sys.argv[2]
-    except IndexError:
-        action = "run"
+    action = _get_action(args)
 
-    if action == "run":
-        _run(day, year, path, use_example=None)
-    elif action == "run-example":
-        _run(day, year, path, use_example=True)
+    if action in ("run", "run-example"):
+        use_example = True if action == "run-example" else None
+        as_json = _pop_flag(args, "--json")
+        use_cache = not _pop_flag(args, "--no-cache")
+        output = _pop_output_mode(args, default="discard" if as_json else "tty")
+        _run(day, year, path, use_example, output, as_json, use_cache)
+    elif action == "bench":
+        _bench(path, use_example=None, args=args)
+    elif action == "bench-example":
+        _bench(path, use_example=True, args=args)
+    elif action in ("watch", "watch-example"):
+        use_example = True if action == "watch-example" else None
+        try:
+            interval = float(_pop_option(args, "--interval") or 0.5)
+        except ValueError:
+            _usage()
+        output = _pop_output_mode(args, default="tty")
+        _watch(day, year, path, use_example, output, interval)
+    elif action == "profile":
+        _profile(path, use_example=None, kind="cpu", args=args)
+    elif action == "memprofile":
+        _profile(path, use_example=None, kind="memory", args=args)
     elif action == "edit":
         if not path.exists():
             _create_from_template(path, day, year)
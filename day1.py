@@ -2,13 +2,13 @@
 https://adventofcode.com/2022/day/1
 """
 
-from typing import IO
+from typing import IO, Iterator
 
-from aoc import puzzle
+from aoc import Answer, Part, puzzle
 
 
 @puzzle
-def day1(input: IO[str]):
+def day1(input: IO[str]) -> Iterator[tuple[Part, Answer]]:
     elves = []
     current_elf = []
     for raw_line in input:
@@ -20,14 +20,13 @@ def day1(input: IO[str]):
             current_elf = []
     if current_elf:
         elves.append(current_elf)
-    
-    print("Part 1")
-    print(max(map(sum, elves)))
+    yield "parse", None
+
+    yield 1, max(map(sum, elves))
 
-    print("Part2")
     summed = [*map(sum, elves)]
     summed.sort(reverse=True)
-    print(sum(summed[:3]))
+    yield 2, sum(summed[:3])
 
 
 if __name__ == "__main__":
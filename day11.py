@@ -2,9 +2,11 @@
 https://adventofcode.com/2022/day/11
 """
 
+from functools import partial
+from os import getenv
 from typing import IO, Callable, Iterator, NamedTuple
 
-from aoc import puzzle
+from aoc import puzzle, puzzle_option
 
 
 class Monkey(NamedTuple):
@@ -30,15 +32,120 @@ def parse_monkey(input: Iterator[str]) -> Monkey:
         "*": int.__mul__,
     }[op]
 
+    # (partials rather than lambdas, so that monkeys can be pickled)
     if right == "old":
-        update = lambda old: op_func(old, old)
+        # (old * old, or old + old)
+        update = partial(pow, exp=2) if op == "*" else partial(int.__mul__, 2)
     else:
-        n = int(right)
-        update = lambda old: op_func(old, n)
+        update = partial(op_func, int(right))
 
     return Monkey(items, update, test, (if_false, if_true))
 
 
+def simulate_rounds(
+    monkeys: list[Monkey], rounds: int, reduction: int, modulo: int
+) -> list[int]:
+    counters = [0 for _ in monkeys]
+    for _ in range(rounds):
+        for i, monkey in enumerate(monkeys):
+            while monkey.items:
+                counters[i] += 1
+                item = monkey.items.pop(0)
+                item = monkey.update(item) // reduction % modulo
+                test = item % monkey.divisible_by == 0
+                throw_to = monkey.throw_to[test]
+                monkeys[throw_to].items.append(item)
+    return counters
+
+
+def item_inspections(
+    monkeys: list[Monkey],
+    monkey: int,
+    item: int,
+    rounds: int,
+    reduction: int,
+    modulo: int,
+) -> list[int]:
+    """
+    How many times each monkey inspects a single item, held by `monkey`,
+    over the rounds. Items don't affect each other, and an item's state at
+    the start of a round (who holds it, its worry level) can only take so
+    many values: once one repeats, the counts of the rounds left are
+    extrapolated from the cycle.
+    """
+    counters = [0 for _ in monkeys]
+    # the counters after each round, and when each state was seen
+    history = [tuple(counters)]
+    seen = {(monkey, item): 0}
+    for round in range(1, rounds + 1):
+        # (an item thrown to a later monkey is inspected again this round)
+        while True:
+            counters[monkey] += 1
+            current = monkeys[monkey]
+            item = current.update(item) // reduction % modulo
+            throw_to = current.throw_to[item % current.divisible_by == 0]
+            if throw_to <= monkey:
+                monkey = throw_to
+                break
+            monkey = throw_to
+        history.append(tuple(counters))
+
+        start = seen.setdefault((monkey, item), round)
+        if start != round:
+            cycles, rest = divmod(rounds - start, round - start)
+            return [
+                before + cycles * (after - cycle_start)
+                for before, after, cycle_start in zip(
+                    history[start + rest], history[round], history[start]
+                )
+            ]
+    return counters
+
+
+def _items_worker(
+    monkeys: list[Monkey],
+    items: list[tuple[int, int]],
+    rounds: int,
+    reduction: int,
+    modulo: int,
+) -> list[int]:
+    counters = [0 for _ in monkeys]
+    for monkey, item in items:
+        for i, n in enumerate(
+            item_inspections(monkeys, monkey, item, rounds, reduction, modulo)
+        ):
+            counters[i] += n
+    return counters
+
+
+def simulate_items(
+    monkeys: list[Monkey],
+    rounds: int,
+    reduction: int,
+    modulo: int,
+    jobs: int | None = 1,
+) -> list[int]:
+    """
+    Same as simulate_rounds(), following each item on its own. With jobs
+    other than 1 (None for one per CPU), items are spread across processes.
+    """
+    items = [(i, item) for i, monkey in enumerate(monkeys) for item in monkey.items]
+    if jobs == 1:
+        return _items_worker(monkeys, items, rounds, reduction, modulo)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(
+                _items_worker, monkeys, [item], rounds, reduction, modulo
+            )
+            for item in items
+        ]
+        results = [future.result() for future in futures]
+    return [sum(counts) for counts in zip(*results)]
+
+
 @puzzle
 def day11(input: IO[str]):
     monkeys: list[Monkey] = []
@@ -47,22 +154,21 @@ def day11(input: IO[str]):
             monkeys.append(parse_monkey(input))
 
     # ROUNDS, REDUCTION = 20, 3  # part 1
-    ROUNDS, REDUCTION = 10000, 1  # part 2
+    ROUNDS, REDUCTION = int(getenv("DAY11_ROUNDS", 10000)), 1  # part 2
+    # "items" follows each item on its own until its state repeats, "parallel"
+    # does the same with the items spread across processes, and "rounds" is
+    # the original simulation of every round
+    engine = puzzle_option("DAY11_ENGINE", "items", "parallel", "rounds")
 
     modulo = 1
     for monkey in monkeys:
         modulo *= monkey.divisible_by
 
-    counters = [0 for _ in monkeys]
-    for _ in range(ROUNDS):
-        for i, monkey in enumerate(monkeys):
-            while monkey.items:
-                counters[i] += 1
-                item = monkey.items.pop(0)
-                item = monkey.update(item) // REDUCTION % modulo
-                test = item % monkey.divisible_by == 0
-                throw_to = monkey.throw_to[test]
-                monkeys[throw_to].items.append(item)
+    if engine == "rounds":
+        counters = simulate_rounds(monkeys, ROUNDS, REDUCTION, modulo)
+    else:
+        jobs = None if engine == "parallel" else 1
+        counters = simulate_items(monkeys, ROUNDS, REDUCTION, modulo, jobs)
     print(counters)
     top2, top1 = sorted(counters)[-2:]
     print("monkey business:", top1 * top2)
@@ -2,10 +2,12 @@
 https://adventofcode.com/2022/day/15
 """
 
+from os import getenv
 import re
 from typing import IO, Iterator
 
 from aoc import puzzle
+from sensors import Sensor, SensorIndex, coverage_by_row
 
 
 Pos = tuple[int, int]
@@ -100,25 +102,11 @@ def day15(input: IO[str]):
     #     tuning_freq = distress[0] * 4000000 + distress[1]
     #     print("tuning frequency =", tuning_freq)
 
-    def merge_segments(segs: list[tuple[int, int]]):
-        if not segs:
-            return
-        start = segs[0][0]
-        end = segs[0][1]
-        for x0, x1 in segs:
-            if x0 > end + 1:
-                yield start, end
-                start = x0
-                end = x1
-            elif x1 > end:
-                end = x1
-        yield start, end
+    index = SensorIndex(Sensor(sx, sy, d) for (sx, sy), _, d in sensors)
 
     print("--------------------")
-    for y in range(-12, 28):
-        # for y in rows:
+    for y in rows:
         print(f"{y:8} ", end="")
-        segments = []
         beacons_on_row = set()
         sensors_on_row = []
         for (sx, sy), (bx, by), distance in sensors:
@@ -126,12 +114,6 @@ def day15(input: IO[str]):
                 beacons_on_row.add(bx)
             if sy == y:
                 sensors_on_row.append(sx)
-            dy = abs(sy - y)
-            if dy <= distance:
-                dx = distance - dy
-                segments.append((sx - dx, sx + dx))
-
-        segments.sort()
 
         covered_count = 0
         x_left = min_x - max_distance
@@ -141,7 +123,7 @@ def day15(input: IO[str]):
         else:
             drawing = []
 
-        for x0, x1 in merge_segments(segments):
+        for x0, x1 in index.row_coverage(y):
             segment_length = x1 - x0 + 1
             covered_count += segment_length
             if draw:
@@ -180,41 +162,10 @@ def day15(input: IO[str]):
         assert distance_wz == distance
         sensors_wz.append(((sw, sz), (bw, bz), distance_wz))
 
-    ws = sorted(
-        set(
-            w
-            for (sw, sz), _, distance in sensors_wz
-            for w in (sw - distance - 1, sw + distance + 1)
-            if (w + sz) // 2 in search_space and (w - sz) // 2 in search_space
-        )
-    )
-
-    # sort by sz - distance (needed by merge)
-    sensors_wz.sort(key=lambda s: s[0][1] - s[2])
-
-    for w in ws:
-        segments = []
-        # This is a quadratic bottleneck but input set is so small that it's
-        # fast enough. If len(sensors) were very large it could be replaced by
-        # some kind of spatial index lookup.
-        for (sw, sz), beacon, distance in sensors_wz:
-            if abs(sw - w) <= distance:
-                segments.append((sz - distance, sz + distance))
-        if not segments:
-            continue
-        merged = merge_segments(segments)
-        try:
-            _, z0 = next(merged)
-            z1, _ = next(merged)
-            print(f"found gap at wz ({w},{z0}-{z1})")
-            assert z1 - z0 == 2, "gap wider than 1 cell"
-            gap_z = z0 + 1
-            x = (w + gap_z) // 2
-            y = (w - gap_z) // 2
-            distress = (x, y)
-            break
-        except StopIteration:
-            pass
+    distress = index.find_gap(search_space, search_space)
+    if distress:
+        x, y = distress
+        print(f"found gap at wz ({x + y},{x - y})")
 
     if draw:
         min_w = min_x + min_y - 8
@@ -262,6 +213,16 @@ def day15(input: IO[str]):
         tuning_freq = distress[0] * 4000000 + distress[1]
         print("tuning frequency =", tuning_freq)
 
+    # set DAY15_CROSS_CHECK to also check part 2 by brute force, row by row
+    # over the whole search space (needs numpy)
+    if getenv("DAY15_CROSS_CHECK"):
+        covered, gaps = coverage_by_row(index.sensors, search_space, search_space)
+        uncovered = len(search_space) ** 2 - int(covered.sum())
+        rows_with_gaps = (gaps <= search_space[-1]).nonzero()[0]
+        found = [(int(gaps[i]), search_space[i]) for i in rows_with_gaps]
+        print(f"brute force: {uncovered} uncovered, first gaps at {found[:10]}")
+        assert found == [distress] and uncovered == 1
+
 
 if __name__ == "__main__":
     day15.run_puzzle()
@@ -2,16 +2,28 @@
 https://adventofcode.com/2022/day/16
 """
 
-from collections import deque
+from array import array
 from heapq import heappush, heappop
 import re
-from typing import IO, Collection, Literal, Sequence, NamedTuple, NewType, Self
+from sys import getsizeof
+from typing import (
+    IO,
+    Collection,
+    Iterable,
+    Iterator,
+    Sequence,
+    NamedTuple,
+    NewType,
+    TYPE_CHECKING,
+)
 
-from aoc import puzzle
+from aoc import Answer, Part, puzzle, puzzle_option
+
+if TYPE_CHECKING:
+    from multiprocessing.sharedctypes import Synchronized
 
 
 Label = NewType("Label", str)
-Path = tuple[Label, ...]
 
 
 class Room(NamedTuple):
@@ -22,6 +34,33 @@ class Room(NamedTuple):
 
 START = Label("AA")
 
+# how often (in cycles) parallel searches check the shared best solution
+SYNC_EVERY = 1000
+
+# moves as (actor, valve) pairs, from the start
+Prefix = tuple[tuple[int, Label], ...]
+# search frames: (prio, timer, actors, upper bound, open valves, value, link)
+Frame = tuple[int, int, int, int, int, int, int]
+
+# search frames pack each actor in 16 bits: minutes left, then valve number
+VALVE_BITS = 8
+VALVE_MASK = (1 << VALVE_BITS) - 1
+ACTOR_BITS = 16
+ACTOR_MASK = (1 << ACTOR_BITS) - 1
+MINUTES_MASK = ACTOR_MASK >> VALVE_BITS
+# ...and link to their parent node (+1, 0 is the root's "no parent") with
+# the move that led to them: which actor moved, and to which valve
+MOVE_BITS = VALVE_BITS + 1
+MOVE_MASK = (1 << MOVE_BITS) - 1
+
+
+def pack_actor(minutes_left: int, valve: int) -> int:
+    return minutes_left << VALVE_BITS | valve
+
+
+def open_labels(labels: Sequence[Label], open_valves: int) -> list[Label]:
+    return [label for i, label in enumerate(labels) if open_valves >> i & 1]
+
 
 def parse_input(input: IO[str]):
     # Valve BB has flow rate=13; tunnels lead to valves CC, AA
@@ -38,214 +77,525 @@ def parse_input(input: IO[str]):
         yield Room(label, flow_rate, exits)
 
 
-def solve_reachability(rooms: dict[Label, Room]) -> dict[Label, dict[Label, Path]]:
-    graph: dict[Label, dict[Label, Path]] = {}
-    for source in rooms.values():
-        if source.flow_rate == 0 and source.label != START:
-            continue
-        paths = {}
-        graph[source.label] = paths
-        queue: deque[tuple[Path, Label]] = deque(
-            [((dest,), dest) for dest in source.exits]
-        )
-        visited = {source.label}
-        while queue:
-            path, label = queue.popleft()
-            room = rooms[label]
-            visited.add(label)
-            if room.flow_rate > 0:
-                try:
-                    prev_cost = len(paths[label])
-                except KeyError:
-                    paths[label] = path
-                else:
-                    if len(path) < prev_cost:
-                        paths[label] = path
-            for exit in room.exits:
-                if exit not in visited:
-                    queue.append(((*path, exit), exit))
+class DistanceMatrix(NamedTuple):
+    """
+    Shortest distances (in minutes) from some source rooms to every room.
 
-    return graph
+    Rooms are indexed by their position in `labels`, and the distances from
+    a source are row `source_row[source]` of the flat `data` array (-1 if
+    unreachable).
+    """
+
+    labels: tuple[Label, ...]
+    room_index: dict[Label, int]
+    source_row: dict[Label, int]
+    data: "array[int]"
+
+    def row(self, source: Label) -> dict[Label, int]:
+        row = self.source_row[source]
+        n = len(self.labels)
+        distances = self.data[row * n : (row + 1) * n]
+        return {label: d for label, d in zip(self.labels, distances) if d >= 0}
+
+
+def distance_matrix(
+    rooms: dict[Label, Room],
+    sources: Iterable[Label] | None = None,
+    stop_at: Collection[Label] = (),
+) -> DistanceMatrix:
+    """
+    BFS from each source (by default every room) over integer room indices.
+
+    Rooms in `stop_at` (other than the source) are reached but not gone
+    through.
+    """
+    labels = tuple(rooms)
+    index = {label: i for i, label in enumerate(labels)}
+    exits = [[index[exit] for exit in room.exits] for room in rooms.values()]
+    stops = {index[label] for label in stop_at}
+    sources = labels if sources is None else tuple(sources)
+    n = len(labels)
+    data = array("i", [-1]) * (n * len(sources))
+    for row, source in enumerate(sources):
+        base = row * n
+        frontier = [index[source]]
+        data[base + frontier[0]] = 0
+        distance = 0
+        while frontier:
+            distance += 1
+            next_frontier: list[int] = []
+            for node in frontier:
+                for exit in exits[node]:
+                    if data[base + exit] < 0:
+                        data[base + exit] = distance
+                        if exit not in stops:
+                            next_frontier.append(exit)
+            frontier = next_frontier
+    source_row = {source: row for row, source in enumerate(sources)}
+    return DistanceMatrix(labels, index, source_row, data)
+
+
+def valve_distances(
+    rooms: dict[Label, Room], start: Label = START
+) -> dict[Label, dict[Label, int]]:
+    """Distances from the start and from each useful valve to the useful valves"""
+    valves = [label for label, room in rooms.items() if room.flow_rate > 0]
+    sources = [start, *(label for label in valves if label != start)]
+    matrix = distance_matrix(rooms, sources)
+    distances: dict[Label, dict[Label, int]] = {}
+    for source in sources:
+        row = matrix.row(source)
+        distances[source] = {
+            dest: row[dest] for dest in valves if dest != source and dest in row
+        }
+    return distances
 
 
 def collapse_graph(
     rooms: dict[Label, Room], start: Label = Label("AA")
 ) -> dict[Label, dict[Label, int]]:
+    # only the direct tunnels between valves, i.e. not going through another
+    # useful valve on the way
+    valves = [label for label, room in rooms.items() if room.flow_rate > 0]
+    sources = [start, *(label for label in valves if label != start)]
+    matrix = distance_matrix(rooms, sources, stop_at=valves)
     graph: dict[Label, dict[Label, int]] = {}
-    for source in rooms.values():
-        if source.flow_rate == 0 and source.label != start:
-            continue
-        paths = {}
-        graph[source.label] = paths
-        for dest in source.exits:
-            stack: list[tuple[int, Label]] = [(1, dest)]
-            visited = [source.label]
-            while stack:
-                cost, label = stack.pop()
-                room = rooms[label]
-                visited.append(label)
-                if room.flow_rate > 0:
-                    prev_cost = paths.get(label, float("inf"))
-                    if cost < prev_cost:
-                        paths[label] = cost
-                else:
-                    for exit in room.exits:
-                        if exit not in visited:
-                            stack.append((cost + 1, exit))
-
+    for source in sources:
+        row = matrix.row(source)
+        graph[source] = {
+            dest: row[dest] for dest in valves if dest != source and dest in row
+        }
     return graph
 
 
 def solve(
-    rooms: dict[Label, Room], start: Label, max_depth: int = 30, two_rooms: bool = False
+    rooms: dict[Label, Room],
+    start: Label,
+    max_depth: int = 30,
+    two_rooms: bool = False,
+    prefixes: Sequence[Prefix] | None = None,
+    shared_best: "Synchronized[int] | None" = None,
+    verbose: bool = True,
 ):
-    graph = solve_reachability(rooms)
-
-    paths = {
-        src: sorted(
-            ((dest, len(path), rooms[dest].flow_rate) for dest, path in paths.items()),
+    """
+    Branch-and-bound search.
+
+    With `prefixes`, the search starts from the frames reached by each given
+    sequence of moves instead of from the root. With `shared_best`, the best
+    value found so far is periodically exchanged with other workers (see
+    solve_parallel()) to prune with the global incumbent.
+
+    Frames are flat tuples of ints: valves are numbered in label order, the
+    open ones are a bitmask, and all the actors are packed in a single int
+    (see pack_actor()). Instead of each frame carrying its own trace, it
+    only links to its parent with the move that led to it. Frames become
+    nodes in the side arrays, where their children can link to them, only
+    when they get expanded.
+    """
+    log = print if verbose else _no_print
+    distances = valve_distances(rooms, start)
+
+    labels = sorted(label for label in distances if label != start)
+    labels.append(start)
+    index = {label: i for i, label in enumerate(labels)}
+    flow_rates = [rooms[label].flow_rate for label in labels]
+    paths = [
+        sorted(
+            (
+                (index[dest], cost, rooms[dest].flow_rate)
+                for dest, cost in distances[src].items()
+            ),
             key=lambda x: (x[1], -x[2]),
         )
-        for src, paths in graph.items()
-    }
-
-    class Actor(NamedTuple):
-        minutes_left: int = max_depth
-        room: Room = rooms[start]
-
-        def __repr__(self):
-            return f"{self.room.label}@{self.minutes_left}"
-
-    class Frame(NamedTuple):
-        prio: int | float
-        timer: int
-        actors: tuple[Actor, ...]
-        upper_bound: int = 999999999
-        open: frozenset[Label] = frozenset()
-        value: int = 0
-        trace: tuple[tuple[int, int, str], ...] = ()
-
-        def go_open(
-            self,
-            label: Label,
-            cost: int,
-            which: Literal[0] | Literal[1],
-        ) -> Self:
-            actor = self.actors[which]
-
-            assert len(graph[actor.room.label][label]) == cost
-            assert label not in self.open
-
-            room = rooms[label]
-            new_open = self.open.union((label,))
-            new_minutes_left = actor.minutes_left - cost - 1
-            value = room.flow_rate * new_minutes_left
-            total_value = self.value + value
-            trace = (which, new_minutes_left, label)
-
-            new_actor = Actor(new_minutes_left, room)
-
-            new_actors = (*self.actors[:which], new_actor, *self.actors[which + 1 :])
-            assert len(new_actors) == len(self.actors)
-
-            # potential_h = (max_valves - len(new_open)) * (new_minutes_left - 2)
-            # potential_h = sum(
-            #     r.flow_rate * new_minutes_left
-            #     for r in rooms.values()
-            #     if r.label not in new_open
-            # )
-            ubound = total_value + ubound_heuristic_two_headed(
-                paths, new_actors, new_open
-            )
-            # lbound, _ = heuristic(graph, rooms, label, new_minutes_left, new_open)
-            # if lbound > best_solution:
-            #     print(lbound)
-
-            return Frame(
-                prio=self.prio - value - ubound,
-                timer=timer,
-                actors=new_actors,
-                upper_bound=ubound,
-                open=new_open,
-                value=total_value,
-                trace=(*self.trace, trace),
-            )
+        for src in labels
+    ]
 
-    max_valves = sum(1 for room in rooms.values() if room.flow_rate > 0)
+    actor_count = 2 if two_rooms else 1
+    root_actor = pack_actor(max_depth, index[start])
+    root_actors = sum(root_actor << (ACTOR_BITS * i) for i in range(actor_count))
+
+    # node -> link of the frame that became that node (a link packs a node
+    # index with a move, and the search only gives up while its queue is
+    # long, so 32 bits could overflow: 64 bits can't in practice)
+    nodes = array("Q")
+
+    def add_node(link: int) -> int:
+        nodes.append(link)
+        return len(nodes) - 1
+
+    def go_open(frame: Frame, valve: int, cost: int, which: int) -> Frame:
+        prio, _, actors, _, open_valves, value, _ = frame
+        shift = ACTOR_BITS * which
+        new_minutes_left = (actors >> shift + VALVE_BITS & MINUTES_MASK) - cost - 1
+        gained = flow_rates[valve] * new_minutes_left
+        new_actors = actors & ~(ACTOR_MASK << shift) | (
+            pack_actor(new_minutes_left, valve) << shift
+        )
+        new_open = open_valves | 1 << valve
+        total_value = value + gained
+        ubound = total_value + ubound_heuristic_two_headed(
+            paths, new_actors, actor_count, new_open
+        )
+        move = which << VALVE_BITS | valve
+        # (only the move, the caller links it to the parent node)
+        return (
+            prio - gained - ubound,
+            timer,
+            new_actors,
+            ubound,
+            new_open,
+            total_value,
+            move,
+        )
 
-    actors = (Actor(),)
-    if two_rooms:
-        actors *= 2
+    def trace(link: int) -> list[tuple[int, int, Label]]:
+        moves = []
+        while link:
+            moves.append(link & MOVE_MASK)
+            link = nodes[(link >> MOVE_BITS) - 1]
+        # minutes left aren't stored, replay the moves to get them back
+        steps = []
+        positions = [start] * actor_count
+        minutes_left = [max_depth] * actor_count
+        for move in reversed(moves):
+            which, label = move >> VALVE_BITS, labels[move & VALVE_MASK]
+            minutes_left[which] -= distances[positions[which]][label] + 1
+            positions[which] = label
+            steps.append((which, minutes_left[which], label))
+        return steps
 
-    queue = [Frame(0, 0, actors)]
     solutions: list[Frame] = []
     best_solution = 0
     timer = 0
+    root: Frame = (0, 0, root_actors, 999999999, 0, 0, 0)
+    queue: list[Frame] = [root]
+    if prefixes is not None:
+        queue = []
+        for prefix in prefixes:
+            frame = root
+            for which, label in prefix:
+                room = labels[frame[2] >> ACTOR_BITS * which & VALVE_MASK]
+                cost = distances[room][label]
+                node = add_node(frame[6])
+                frame = go_open(frame, index[label], cost, which)
+                frame = (*frame[:6], node + 1 << MOVE_BITS | frame[6])
+            heappush(queue, frame)
+    peak_frontier = len(queue)
+
     while queue:
         if timer % 10_000 == 0:
-            print(f"... {len(queue)=} ...")
-        # if timer < 10:
-        #     print(f"Queue at {timer=}:")
-        #     for x in sorted(queue):
-        #         print(
-        #             f"{x.prio:5} depth {x.actors} value={x.value:4}: {', '.join(x.trace)}"
-        #         )
-        #     print()
+            log(f"... {len(queue)=} ...")
+        if shared_best is not None and timer % SYNC_EVERY == 0:
+            best_solution = max(best_solution, shared_best.value)
 
         timer += 1
         if timer > 8_000_000 and len(queue) > 100:
-            print("\n\n!!!!!!!!!!!!!!!!!!!!!!!! GIVING UP !!!!!!!!!!!!!!!!!!!!!!!!")
-            print(f"{len(queue)} items left in queue")
+            log("\n\n!!!!!!!!!!!!!!!!!!!!!!!! GIVING UP !!!!!!!!!!!!!!!!!!!!!!!!")
+            log(f"{len(queue)} items left in queue")
             break
 
         current = heappop(queue)
+        _, _, actors, upper_bound, open_valves, value, link = current
 
-        if current.upper_bound < best_solution:
+        if upper_bound < best_solution:
             continue
 
         any_exit = False
-        which = max(range(len(actors)), key=lambda i: current.actors[i].minutes_left)
-        assert which in (0, 1)
-        actor = current.actors[which]
-        for destination, cost, _ in paths[actor.room.label]:
-            if actor.minutes_left > cost + 1 and destination not in current.open:
+        which = max(
+            range(actor_count),
+            key=lambda i: actors >> ACTOR_BITS * i + VALVE_BITS & MINUTES_MASK,
+        )
+        minutes_left = actors >> ACTOR_BITS * which + VALVE_BITS & MINUTES_MASK
+        room = actors >> ACTOR_BITS * which & VALVE_MASK
+        node = -1
+        for destination, cost, _ in paths[room]:
+            if minutes_left > cost + 1 and not open_valves >> destination & 1:
                 any_exit = True
-                frame = current.go_open(destination, cost, which)
+                frame = go_open(current, destination, cost, which)
                 # (early pruning, the real check is done when popping)
-                if frame.upper_bound > best_solution:
-                    heappush(queue, frame)
+                if frame[3] > best_solution:
+                    if node < 0:
+                        node = add_node(link)
+                    heappush(queue, (*frame[:6], node + 1 << MOVE_BITS | frame[6]))
+        if len(queue) > peak_frontier:
+            peak_frontier = len(queue)
 
         if not any_exit:
-            if current.value > best_solution:
-                print("found new solution")
-                print("open", current.open)
-                print("total relieved pressure", current.value)
+            if value > best_solution:
+                log("found new solution")
+                log("open", open_labels(labels, open_valves))
+                log("total relieved pressure", value)
                 solutions.append(current)
-                best_solution = current.value
+                best_solution = value
+                if shared_best is not None:
+                    with shared_best.get_lock():
+                        if shared_best.value < best_solution:
+                            shared_best.value = best_solution
     else:
-        print(f"\n======= Solutions (after {timer} cycles) =======\n")
-
-    solutions.sort(key=lambda s: s.value)
-    for solution in solutions:
-        print("found at cycle", solution.timer)
-        print("open valves", ", ".join(sorted(solution.open)))
-        print("total relieved pressure", solution.value)
-        print(("|" + " 1 2 3 4 5 6 7 8 9 |" * 3)[: (max_depth + 1) * 2])
+        log(f"\n======= Solutions (after {timer} cycles) =======\n")
+
+    # (a rough estimate: the tuple, its ints and the slot in the heap)
+    sample = solutions[-1] if solutions else root
+    frame_size = getsizeof(sample) + sum(map(getsizeof, sample)) + 8
+    trace_size = len(nodes) * nodes.itemsize
+    log(
+        f"peak frontier: {peak_frontier} frames, "
+        f"~{peak_frontier * frame_size / 1024:.1f} KiB "
+        f"(+ {trace_size / 1024:.1f} KiB for {len(nodes)} trace nodes)"
+    )
+
+    solutions.sort(key=lambda s: s[5])
+    for _, found_at, _, _, open_valves, value, link in solutions:
+        log("found at cycle", found_at)
+        log("open valves", ", ".join(open_labels(labels, open_valves)))
+        log("total relieved pressure", value)
+        log(("|" + " 1 2 3 4 5 6 7 8 9 |" * 3)[: (max_depth + 1) * 2])
         for actor in 0, 1:
             time = max_depth
-            for which, minutes_left, room in solution.trace:
+            for which, minutes_left, room in trace(link):
                 if which == actor:
                     prefix = (time - minutes_left) * 2
                     time = minutes_left - 1
-                    print(" " * prefix + room, end="")
-            print()
-        print()
+                    log(" " * prefix + room, end="")
+            log()
+        log()
+
+    # (only what this search found, the shared bound could come from elsewhere)
+    return solutions[-1][5] if solutions else 0
+
+
+def _no_print(*args: object, **kwargs: object) -> None:
+    pass
+
+
+def split_search(
+    distances: dict[Label, dict[Label, int]],
+    start: Label,
+    max_depth: int,
+    actors: int,
+    depth: int,
+) -> list[Prefix]:
+    """
+    All the sequences of the first `depth` moves, choosing the actor to move
+    the same way as solve() does. Sequences that only differ by swapping two
+    actors that are still identical are only included once.
+    """
+    prefixes: list[Prefix] = []
+
+    def extend(prefix: Prefix, rooms: list[Label], minutes: list[int]):
+        if len(prefix) == depth:
+            prefixes.append(prefix)
+            return
+        which = max(range(actors), key=lambda i: minutes[i])
+        opened = {label for _, label in prefix}
+        any_exit = False
+        for destination, cost in distances[rooms[which]].items():
+            if minutes[which] > cost + 1 and destination not in opened:
+                if which == 1 and len(prefix) == 1 and destination < prefix[0][1]:
+                    # second actor's first move: the same as swapping actors
+                    # in a sequence that is already included
+                    continue
+                any_exit = True
+                new_rooms = [*rooms]
+                new_rooms[which] = destination
+                new_minutes = [*minutes]
+                new_minutes[which] -= cost + 1
+                extend((*prefix, (which, destination)), new_rooms, new_minutes)
+        if not any_exit:
+            prefixes.append(prefix)
+
+    extend((), [start] * actors, [max_depth] * actors)
+    return prefixes
+
+
+_shared_best: "Synchronized[int] | None" = None
+
+
+def _init_worker(shared_best: "Synchronized[int]"):
+    global _shared_best
+    _shared_best = shared_best
+
+
+def _solve_worker(
+    rooms: dict[Label, Room],
+    start: Label,
+    max_depth: int,
+    two_rooms: bool,
+    prefixes: Sequence[Prefix],
+) -> int:
+    return solve(
+        rooms, start, max_depth, two_rooms, prefixes, _shared_best, verbose=False
+    )
+
+
+def solve_parallel(
+    rooms: dict[Label, Room],
+    start: Label,
+    max_depth: int = 30,
+    two_rooms: bool = False,
+    jobs: int | None = None,
+) -> int:
+    """
+    Branch-and-bound search split at the first move of each actor, with each
+    subtree searched by a worker process. All workers prune with the best
+    value found by any of them, shared through a multiprocessing.Value.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import Value
+
+    actors = 2 if two_rooms else 1
+    distances = valve_distances(rooms, start)
+    prefixes = split_search(distances, start, max_depth, actors, depth=actors)
+    print(f"searching {len(prefixes)} subtrees in parallel")
+
+    shared_best = Value("q", 0)
+    with ProcessPoolExecutor(
+        jobs, initializer=_init_worker, initargs=(shared_best,)
+    ) as executor:
+        # one subtree per task, so that idle workers pick up the next one
+        futures = [
+            executor.submit(
+                _solve_worker, rooms, start, max_depth, two_rooms, [prefix]
+            )
+            for prefix in prefixes
+        ]
+        best = max(future.result() for future in futures)
+    return max(best, shared_best.value)
+
+
+def best_release_by_mask(
+    flow_rates: Sequence[int],
+    distances: Sequence[Sequence[int]],
+    start: int,
+    max_depth: int,
+    only_max: bool = False,
+) -> dict[int, int]:
+    """
+    Best pressure released for each set of opened valves (as a bitmask).
+
+    Useful valves are indexed 0..n-1 in `flow_rates`, and `distances[i][j]` is
+    the cost of moving from valve i to valve j, where index n is the start.
+
+    States are (valve, minutes left, open mask), keeping only the best value
+    for each. They are expanded from the most to the least minutes left, so
+    every state is final by the time it's popped, and a state is skipped if
+    the same valve and mask were already reached with more time left and at
+    least the same value. There's no cutoff, so the result is exact.
+
+    With `only_max`, only the best value of all is exact: states that can't
+    beat it, even opening the closed valves from the largest flow rate down
+    as often as the cheapest move allows, are dropped.
+    """
+    # for each valve, the moves to the other valves sorted by cost (including
+    # the minute spent to open the valve)
+    moves = [
+        sorted(
+            (from_valve[next_valve] + 1, next_valve, 1 << next_valve)
+            for next_valve in range(len(flow_rates))
+            if from_valve[next_valve] > 0
+        )
+        for from_valve in distances
+    ]
+    by_flow_rate = sorted(
+        ((rate, 1 << valve) for valve, rate in enumerate(flow_rates)), reverse=True
+    )
+    # (opening a valve takes at least the cheapest move)
+    step = min((cost for valve_moves in moves for cost, _, _ in valve_moves), default=2)
+    bounds: dict[tuple[int, int], int] = {}
+
+    def bound(mask: int, minutes_left: int) -> int:
+        key = (mask, minutes_left)
+        if key not in bounds:
+            total = 0
+            for rate, bit in by_flow_rate:
+                if minutes_left <= step:
+                    break
+                if not mask & bit:
+                    minutes_left -= step
+                    total += rate * minutes_left
+            bounds[key] = total
+        return bounds[key]
+
+    # levels[t] maps (valve, open mask) to the best value with t minutes left
+    levels: list[dict[tuple[int, int], int]] = [{} for _ in range(max_depth + 1)]
+    levels[max_depth][start, 0] = 0
+    expanded: dict[tuple[int, int], int] = {}
+    best: dict[int, int] = {}
+    best_value = -1
+    for minutes_left in range(max_depth, 0, -1):
+        # (levels are dropped once done with, only the later ones are needed)
+        level, levels[minutes_left] = levels[minutes_left], {}
+        for key, value in level.items():
+            if expanded.get(key, -1) >= value:
+                continue
+            expanded[key] = value
+            valve, mask = key
+            if best.get(mask, -1) < value:
+                best[mask] = value
+                best_value = max(best_value, value)
+            if only_max and value + bound(mask, minutes_left) <= best_value:
+                continue
+            for cost, next_valve, bit in moves[valve]:
+                next_minutes_left = minutes_left - cost
+                if next_minutes_left <= 0:
+                    break
+                if mask & bit:
+                    continue
+                next_value = value + flow_rates[next_valve] * next_minutes_left
+                next_level = levels[next_minutes_left]
+                next_key = (next_valve, mask | bit)
+                if next_level.get(next_key, -1) < next_value:
+                    next_level[next_key] = next_value
+    return best
+
+
+def best_disjoint_pair(best: dict[int, int], valve_count: int) -> int:
+    """Best sum of the values of two disjoint masks (i.e. two actors)"""
+    size = 1 << valve_count
+    # best_subset[m] = best value for any subset of m (sum over subsets DP),
+    # using slices so that max() is mapped over whole runs of masks at once
+    best_subset = [0] * size
+    for mask, value in best.items():
+        best_subset[mask] = value
+    for i in range(valve_count):
+        bit = 1 << i
+        if bit * bit * 2 < size:
+            # few long strided runs: masks with this bit set, offset by offset
+            for offset in range(bit):
+                high = slice(offset + bit, size, bit * 2)
+                low = slice(offset, size, bit * 2)
+                best_subset[high] = map(max, best_subset[high], best_subset[low])
+        else:
+            # few long contiguous blocks
+            for block in range(0, size, bit * 2):
+                high = slice(block + bit, block + bit * 2)
+                low = slice(block, block + bit)
+                best_subset[high] = map(max, best_subset[high], best_subset[low])
+    everything = size - 1
+    return max(value + best_subset[everything ^ mask] for mask, value in best.items())
+
+
+def solve_dp(
+    rooms: dict[Label, Room], start: Label, max_depth: int = 30, two_rooms: bool = False
+) -> int:
+    distances = valve_distances(rooms, start)
+    useful = [label for label, room in rooms.items() if room.flow_rate > 0]
+    flow_rates = [rooms[label].flow_rate for label in useful]
+    labels = [*useful, start]
+    costs = [[distances[src].get(dest, 0) for dest in useful] for src in labels]
+
+    # (a single actor only needs the best mask, a pair needs all of them)
+    best = best_release_by_mask(
+        flow_rates, costs, len(useful), max_depth, only_max=not two_rooms
+    )
+    if two_rooms:
+        return best_disjoint_pair(best, len(useful))
+    return max(best.values())
 
 
 def draw_map(rooms: dict[Label, Room]):
     import graphviz
 
-    # graph = solve_reachability(rooms)
     graph = collapse_graph(rooms)
 
     dot = graphviz.Graph(
@@ -301,7 +651,7 @@ def draw_map(rooms: dict[Label, Room]):
 
 
 def ubound_heuristic(
-    graph: dict[Label, dict[Label, Path]],
+    distances: dict[Label, dict[Label, int]],
     rooms: dict[Label, Room],
     start: Label,
     turns: int,
@@ -313,13 +663,12 @@ def ubound_heuristic(
     room = start
     values = [
         (
-            (turns - len(paths) - 1) * rooms[r].flow_rate,
-            -len(paths),
+            (turns - distance - 1) * rooms[r].flow_rate,
+            -distance,
             r,
         )
-        for r, paths in graph[room].items()
-        # for r, path in graph[room].items()
-        if (turns - len(paths) - 1) > 0 and r not in open_valves
+        for r, distance in distances[room].items()
+        if (turns - distance - 1) > 0 and r not in open_valves
     ]
     if values:
         # as an upper bound, we imagine an ideal path where we collect
@@ -343,9 +692,10 @@ def ubound_heuristic(
 
 # @profile
 def ubound_heuristic_two_headed(
-    paths: dict[Label, list[tuple[Label, int, int]]],
-    actors: tuple[tuple[int, Room], ...],
-    open_valves: Collection[Label] = (),
+    paths: Sequence[list[tuple[int, int, int]]],
+    actors: int,
+    actor_count: int,
+    open_valves: int = 0,
     heappush=heappush,
     heappop=heappop,
 ) -> int:
@@ -353,11 +703,13 @@ def ubound_heuristic_two_headed(
     # the best value by jumping from the top room to the next best
     # in 1 minute (+1 to open the valve)
     upper = 0
-    for turns, room in actors:
+    for i in range(actor_count):
+        actor = actors >> ACTOR_BITS * i
+        turns = actor >> VALVE_BITS & MINUTES_MASK
         values = []
-        for r, distance, flow_rate in paths[room.label]:
+        for r, distance, flow_rate in paths[actor & VALVE_MASK]:
             path_turns = turns - distance - 1
-            if r in open_valves or path_turns < 0:
+            if open_valves >> r & 1 or path_turns < 0:
                 continue
             # values.append((-path_turns * flow_rate, -path_turns, r, flow_rate))
             heappush(values, (-path_turns * flow_rate, -path_turns, r, flow_rate))
@@ -380,7 +732,7 @@ def ubound_heuristic_two_headed(
 
 
 def heuristic(
-    graph: dict[Label, dict[Label, Path]],
+    distances: dict[Label, dict[Label, int]],
     rooms: dict[Label, Room],
     start: Label,
     turns: int,
@@ -393,10 +745,6 @@ def heuristic(
     visited = [*open_valves]
     upper = None
     # print("starting", room, total, "turns", turns)
-    distances = {
-        src: {dest: len(path) for dest, path in paths.items()}
-        for src, paths in graph.items()
-    }
     while True:
         values = [
             (
@@ -405,7 +753,6 @@ def heuristic(
                 r,
             )
             for r, distance in distances[room].items()
-            # for r, path in graph[room].items()
             if (turns - distance - 1) > 0 and r not in visited
         ]
         if values:
@@ -420,7 +767,7 @@ def heuristic(
 
 
 def reconstruct_steps(rooms: dict[Label, Room], path: Sequence[Label]):
-    graph = solve_reachability(rooms)
+    distances = valve_distances(rooms)
 
     path = list(path)
     turns = 30
@@ -430,8 +777,8 @@ def reconstruct_steps(rooms: dict[Label, Room], path: Sequence[Label]):
     lower_global = 0
     while True:
         print(visited)
-        lower = heuristic(graph, rooms, start, turns, visited, value)
-        upper = ubound_heuristic(graph, rooms, start, turns, visited)
+        lower = heuristic(distances, rooms, start, turns, visited, value)
+        upper = ubound_heuristic(distances, rooms, start, turns, visited)
         lower_global = max(lower, lower_global)
         print(lower, upper)
         if not path:
@@ -442,23 +789,23 @@ def reconstruct_steps(rooms: dict[Label, Room], path: Sequence[Label]):
             (
                 destination,
                 heuristic(
-                    graph,
+                    distances,
                     rooms,
                     destination,
-                    turns - len(path) - 1,
+                    turns - distance - 1,
                     (*visited, destination),
-                    value + rooms[destination].flow_rate * (turns - len(path) - 1),
+                    value + rooms[destination].flow_rate * (turns - distance - 1),
                 ),
                 ubound_heuristic(
-                    graph,
+                    distances,
                     rooms,
                     destination,
-                    turns - len(path) - 1,
+                    turns - distance - 1,
                     (*visited, destination),
-                    value + rooms[destination].flow_rate * (turns - len(path) - 1),
+                    value + rooms[destination].flow_rate * (turns - distance - 1),
                 ),
             )
-            for destination, path in graph[start].items()
+            for destination, distance in distances[start].items()
             if destination not in visited
         ]
         best_lower_bound = max(
@@ -470,7 +817,7 @@ def reconstruct_steps(rooms: dict[Label, Room], path: Sequence[Label]):
             )
 
         step = path.pop(0)
-        cost = len(graph[start][step]) + 1
+        cost = distances[start][step] + 1
         turns -= cost
         value += rooms[step].flow_rate * turns
         visited.append(step)
@@ -479,18 +826,31 @@ def reconstruct_steps(rooms: dict[Label, Room], path: Sequence[Label]):
 
 
 @puzzle
-def day16(input: IO[str]):
+def day16(input: IO[str]) -> Iterator[tuple[Part, Answer]]:
     rooms = {r.label: r for r in parse_input(input)}
     assert START in rooms
+    yield "parse", None
 
     # reconstruct_steps(rooms, ["DD", "BB", "JJ", "HH", "EE", "CC"])
     # draw_map(rooms)
 
+    # "dp" is exact and fast, "search" is the original branch-and-bound, and
+    # "parallel" is the same search split across processes
+    solver = puzzle_option("DAY16_SOLVER", "dp", "search", "parallel")
+    if solver == "dp":
+        yield 1, solve_dp(rooms, START)
+        yield 2, solve_dp(rooms, START, max_depth=26, two_rooms=True)
+        return
+    if solver == "parallel":
+        yield 1, solve_parallel(rooms, START)
+        yield 2, solve_parallel(rooms, START, max_depth=26, two_rooms=True)
+        return
+
     print("Part 1\n-----------------------------")
-    solve(rooms, START)
+    yield 1, solve(rooms, START)
     # part 1: 1880
     print("Part 2\n-----------------------------")
-    solve(rooms, START, max_depth=26, two_rooms=True)
+    yield 2, solve(rooms, START, max_depth=26, two_rooms=True)
 
 
 if __name__ == "__main__":
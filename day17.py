@@ -31,6 +31,9 @@ PIECES_SOURCE = """
 
 Shape = tuple[tuple[bool, ...], ...]
 
+FIELD_WIDTH = 7
+FULL_ROW = (1 << FIELD_WIDTH) - 1
+
 
 class Piece:
     def __init__(self, shape: Shape):
@@ -45,12 +48,21 @@ class Piece:
         left_contour = [min(x for x in range(width) if row[x]) for row in shape]
         right_contour = [max(x for x in range(width) if row[x]) for row in shape]
 
+        # one bit per cell, x = 0 is the lowest bit; rows start at the bottom
+        rows = tuple(
+            sum(1 << x for x, b in enumerate(row) if b) for row in reversed(shape)
+        )
+
         self.shape = shape
         self.width = width
         self.height = height
         self.bottom_contour = bottom_contour
         self.left_contour = left_contour
         self.right_contour = right_contour
+        # row masks for each x where the piece fits in the field
+        self.masks = tuple(
+            tuple(row << x for row in rows) for x in range(FIELD_WIDTH - width + 1)
+        )
 
     def blocks(self):
         for y, row in enumerate(self.shape):
@@ -79,59 +91,98 @@ PIECES = load_pieces(PIECES_SOURCE)
 
 
 class Field:
-    BREADTH = range(7)
-    COLORS = ["🟦", "🟧", "🟩", "🟨", "🟪"]
+    BREADTH = range(FIELD_WIDTH)
+
+    # rows kept at least, before looking for rows to forget (see trim())
+    MIN_WINDOW = 64
 
     def __init__(self):
-        # rows start at the bottom, i.e. y = 0 is bottom line
-        self.data: list[list[int]] = []
-        self._colors = cycle(range(1, 1 + len(Field.COLORS)))
+        # rows start at the bottom, i.e. y = 0 is bottom line, and each row
+        # is a bitmask of its blocks (see Piece.masks). Only the rows from
+        # `base` up are kept: nothing can reach the ones below anymore.
+        self.data = bytearray()
+        self.base = 0
+        self._trim_at = Field.MIN_WINDOW
 
     @property
     def height(self) -> int:
-        return len(self.data)
+        return self.base + len(self.data)
 
     def has_block(self, x: int, y: int) -> bool:
+        """Whether (x, y) is blocked (rows that were forgotten all are)"""
         if x not in Field.BREADTH:
             raise ValueError(f"x must be in [0,7), not {x!r}")
         if y < 0:
             raise ValueError(f"y must be >= 0, not {y!r}")
-        try:
-            return self.data[y][x] != 0
-        except IndexError:
-            return False
+        y -= self.base
+        return y < 0 or y < len(self.data) and self.data[y] >> x & 1 == 1
 
     def collides(self, piece: Piece, x: int, y: int) -> bool:
-        for bx, by in piece.blocks():
-            field_x = bx + x
-            field_y = by + y
-            if field_x not in Field.BREADTH:
-                return True
-            if field_y < 0:
-                return True
-            if self.has_block(field_x, field_y):
+        y -= self.base
+        if y < 0 or not 0 <= x < len(piece.masks):
+            return True
+        data = self.data
+        top = len(data)
+        for mask in piece.masks[x]:
+            if y >= top:
+                return False
+            if data[y] & mask:
                 return True
+            y += 1
         return False
 
     def drop(self, piece: Piece, x: int, y: int) -> None:
-        color = next(self._colors)
-        for bx, by in piece.blocks():
-            field_x = bx + x
-            field_y = by + y
-            new_rows = field_y - self.height + 1
-            self._extend(new_rows)
-            assert self.data[field_y][field_x] == 0
-            # self.data[field_y][field_x] = color
-            self.data[field_y][field_x] = 1
-
-    def _extend(self, rows: int):
-        for _ in range(rows):
-            self.data.append([0] * len(self.BREADTH))
+        data = self.data
+        for row, mask in enumerate(piece.masks[x], y - self.base):
+            if row >= len(data):
+                data.extend(bytes(row - len(data) + 1))
+            assert not data[row] & mask
+            data[row] |= mask
+        if len(data) >= self._trim_at:
+            self.trim()
+
+    def trim(self) -> None:
+        """Forget the rows that no piece can reach anymore.
+
+        Pieces only move down, left and right, so any empty cell a piece can
+        move into is also reachable from above by a single block, moving the
+        same way. Below the lowest row with such a cell, pieces can only ever
+        test blocked cells, so those rows can go.
+        """
+        data = self.data
+        reach = FULL_ROW
+        lowest = len(data)
+        for y in range(len(data) - 1, -1, -1):
+            free = ~data[y] & FULL_ROW
+            reach &= free
+            # spread sideways within the row
+            while (spread := (reach | reach << 1 | reach >> 1) & free) != reach:
+                reach = spread
+            if not reach:
+                break
+            lowest = y
+        # (CPython deletes from the front of a bytearray without moving it)
+        del data[:lowest]
+        self.base += lowest
+        self._trim_at = max(Field.MIN_WINDOW, 2 * len(data))
+
+    def skyline(self) -> tuple[int, ...]:
+        """Depth of the highest block of each column, from the top"""
+        # (columns without blocks go all the way down to the window's floor)
+        depths = [len(self.data)] * FIELD_WIDTH
+        seen = 0
+        for depth, row in enumerate(reversed(self.data)):
+            for x in Field.BREADTH:
+                if row >> x & 1 and not seen >> x & 1:
+                    depths[x] = depth
+            seen |= row
+            if seen == FULL_ROW:
+                break
+        return tuple(depths)
 
     def draw(self):
-        for y in range(self.height)[::-1]:
-            line = "".join(Field.COLORS[x - 1] if x else "⬛️" for x in self.data[y])
-            print(line)
+        for row in reversed(self.data):
+            print("".join("🟦" if row >> x & 1 else "⬛️" for x in Field.BREADTH))
 
 
 @puzzle
@@ -143,121 +194,51 @@ def day17(input: IO[str]):
     _, field1 = simulate(PIECES, jets, 2022)
     print("part 1:", field1.height)
 
-    # part 2
-    #
-    # terrible, terrible approach but it works, and I didn't have to rewrite
-    # the simulation. let's do it right another time maybe
-
     PART_2_N = 1000000000000
-    _, field2 = simulate(PIECES, jets, 10000)
-
-    def render_row(row):
-        return "".join("🟦" if x else "⬛️" for x in row)
-
-    def find_repeats(data):
-        print(f"{len(data)=}")
-        for i1 in range(len(data)):
-            for size in range(2, len(data) - i1 - 1):
-                repeats = (len(data) - i1 - 1) // size - 1
-                if not repeats:
-                    break
-                # print(i1, "size", size, "times", repeats)
-                for n in range(repeats):
-                    for i in range(size):
-                        if data[i1 + size * n + i] != data[i1 + size * (n + 1) + i]:
-                            break
-                    else:
-                        # print("maybe", i1, size, n)
-                        continue
-                    # print("nope", i1, size, n)
-                    break
-                else:
-                    print(i1, size, "good")
-                    # print("\n".join(render_row(r) for r in data[i1:i1+size][::-1]))
-                    # print()
-                    # print("\n".join(render_row(r) for r in data[i1+size:i1+2*size][::-1]))
-                    return i1, size
-                # print()
-        raise RuntimeError
-
-    initial, period = find_repeats(field2.data)
-
-    # print(f"{initial%len(PIECES)=} {period%len(PIECES)=}")
-    
-    # print("\n".join(render_row(r) for r in field2.data[:initial][::-1]))
-    # print()
-    # print("\n".join(render_row(r) for r in field2.data[initial:initial+period][::-1]))
-    # print()
-    # print("\n".join(render_row(r) for r in field2.data[initial+period:initial+2*period][::-1]))
-
-    print()
-    n, field = simulate(PIECES, jets, 10000, stop_at_height=initial)
-    print("n ", n, field.height, field.height == initial)
-    n2, field = simulate(PIECES, jets, 10000, stop_at_height=initial+period)
-    print("n2", n2, field.height, field.height == initial + period)
-
-    prev = n2
-    period_in_drops = -1
-    # just to double-check, okay?
-    for i in range(2, 10):
-        stop_at_height = initial + i * period
-        n2b, field = simulate(PIECES, jets, prev * 4, stop_at_height=stop_at_height)
-        assert field.height == stop_at_height
-        period_in_drops = n2b - prev
-        print("  ", n2b, field.height, field.height == initial + i * period, period_in_drops)
-        prev = n2b
-
-    # we know that the first `initial+period` height is done in `n2` drops
-    # we know that each additional `period_in_drops` drops add `period` height
-
-    print(f"{initial = }")
-    print(f"{period = }")
-    print(f"{initial+period = }")
-    print(f"{n2 = }")
-
-    times, remainder = divmod(PART_2_N - n2, period_in_drops)
-    print(f"{PART_2_N - n2 = } = {times} * {period_in_drops} + {remainder}")
-    K = 2
-    n3, field = simulate(PIECES, jets, n2 + remainder + K * period_in_drops, stop_at_height=20000)
-    print("remainder", remainder, "n3", n3, field.height)
-    assert n3 == remainder + n2 + K * period_in_drops
-    remaninder_height = field.height - initial - K * period
-    print("remainder_height", remaninder_height)
-
-    height = initial + period * times + remaninder_height
-    print("part 2:", height)
+    print("part 2:", tower_height(PIECES, jets, PART_2_N))
+
+
+def fall(field: Field, piece: Piece, jets: Sequence[int], jet: int) -> int:
+    """Drop a piece onto the field, starting from the `jet`-th jet.
+
+    Returns the index of the next jet.
+    """
+    # position always refers to bottom-right corner of piece
+    x = 2
+    y = field.height + 3
+
+    # Note: starting pos is always collision-free by definition, and so
+    # are the next rows down to the top of the field: until then, only
+    # the walls can stop the jets
+    last_x = len(piece.masks) - 1
+    jet_count = len(jets)
+    for _ in range(3):
+        x = min(max(x + jets[jet], 0), last_x)
+        jet = (jet + 1) % jet_count
+    y -= 3
+
+    collides = field.collides
+    while True:
+        # first: (attempt to) move left/right according to stream
+        new_x = x + jets[jet]
+        jet = (jet + 1) % jet_count
+        if 0 <= new_x <= last_x and not collides(piece, new_x, y):
+            x = new_x
+
+        # next: drop down one row
+        new_y = y - 1
+        if collides(piece, x, new_y):
+            field.drop(piece, x, y)
+            return jet
+        y = new_y
 
 
 def simulate(pieces: Sequence[Piece], jets: Sequence[int], n: int, draw: bool = False, stop_at_height: int = 10000):
-    iter_pieces = cycle(iter(pieces))
-    iter_jets = cycle(iter(jets))
     field = Field()
     dropped_pieces = 0
-    base = 0
-    for piece in islice(iter_pieces, n):
-        # position always refers to bottom-right corner of piece
-        x = 2
-        y = field.height + 3
-
-        # field.drop(piece, x, y)
-        # field.draw()
-        # return
-        # Note: starting pos is always collision-free by definition
-        falling = True
-        while falling:
-            # first: (attempt to) move left/right according to stream
-            push = next(iter_jets)
-            new_x = x + push
-            if not field.collides(piece, new_x, y):
-                x = new_x
-
-            # next: drop down one row
-            new_y = y - 1
-            if field.collides(piece, x, new_y):
-                field.drop(piece, x, y)
-                falling = False
-            else:
-                y = new_y
+    jet = 0
+    for piece in islice(cycle(pieces), n):
+        jet = fall(field, piece, jets, jet)
 
         if draw and field.height < 30:
             field.draw()
@@ -267,14 +248,42 @@ def simulate(pieces: Sequence[Piece], jets: Sequence[int], n: int, draw: bool =
         dropped_pieces += 1
         if field.height >= stop_at_height:
             break
-        # if all(field.data[-1]):
-        #     print(field.height, dropped_pieces)
-        #     base += field.height
-        #     dropped_pieces = 0
-        #     field = Field()
 
     return dropped_pieces, field
 
 
+def tower_height(pieces: Sequence[Piece], jets: Sequence[int], n: int) -> int:
+    """Height of the tower after dropping `n` pieces.
+
+    The simulation stops as soon as a state repeats, i.e. the same piece
+    starts falling at the same jet onto the same skyline, and the rest of
+    the height is extrapolated from the cycle between the two.
+    """
+    field = Field()
+    # state -> pieces dropped before it was first seen
+    seen: dict[tuple[int, int, tuple[int, ...]], int] = {}
+    # pieces dropped -> height of the field
+    heights: list[int] = []
+    jet = 0
+    for dropped in range(n):
+        which = dropped % len(pieces)
+        state = (which, jet, field.skyline())
+        heights.append(field.height)
+        if state in seen:
+            start = seen[state]
+            period = dropped - start
+            times, remainder = divmod(n - dropped, period)
+            growth = field.height - heights[start]
+            return (
+                field.height
+                + times * growth
+                + heights[start + remainder]
+                - heights[start]
+            )
+        seen[state] = dropped
+        jet = fall(field, pieces[which], jets, jet)
+    return field.height
+
+
 if __name__ == "__main__":
     day17.run_puzzle()
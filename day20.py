@@ -2,31 +2,54 @@
 https://adventofcode.com/2022/day/20
 """
 
-from typing import IO
+from math import isqrt
+from typing import IO, Callable, Iterable, Iterator
 
-from aoc import puzzle
+from aoc import puzzle, puzzle_option
 
 
 @puzzle
 def day20(input: IO[str]):
     cipher = [int(x) for x in input]
+    # "blocks" moves numbers around in a BlockList, "positions" is the
+    # original approach of rewriting every position after each move, and
+    # "numpy" is the same with numpy arrays (needs numpy)
+    mix = MIXERS[puzzle_option("DAY20_MIXER", "blocks", "positions", "numpy")]
 
     print("part 1\n------------------------------")
-    decrypt(cipher)
+    decrypt(cipher, mix)
 
     print("part 2\n------------------------------")
     KEY = 811589153
     RUNS = 10
     cipher2 = [x * KEY for x in cipher]
-    decrypt(cipher2, RUNS)
+    decrypt(cipher2, mix, RUNS)
 
 
-def decrypt(cipher: list[int], runs: int = 1):
+def decrypt(
+    cipher: list[int], mix: Callable[[list[int], int], list[int]], runs: int = 1
+):
     length = len(cipher)
-    positions = [*range(len(cipher))]
 
     print(f"{length=}")
 
+    plain = mix(cipher, runs)
+    index_zero = plain.index(0)
+    print(f"{plain[(index_zero + 1000) % length]}")
+    print(f"{plain[(index_zero + 2000) % length]}")
+    print(f"{plain[(index_zero + 3000) % length]}")
+    print(
+        "decrypted:",
+        plain[(index_zero + 1000) % length]
+        + plain[(index_zero + 2000) % length]
+        + plain[(index_zero + 3000) % length],
+    )
+
+
+def mix_positions(cipher: list[int], runs: int) -> list[int]:
+    length = len(cipher)
+    positions = [*range(len(cipher))]
+
     def get_plain():
         l = [999999999999] * length
         for c, pos in zip(cipher, positions):
@@ -57,17 +80,131 @@ def decrypt(cipher: list[int], runs: int = 1):
 
             # print(get_plain())
 
-    plain = get_plain()
-    index_zero = plain.index(0)
-    print(f"{plain[(index_zero + 1000) % length]}")
-    print(f"{plain[(index_zero + 2000) % length]}")
-    print(f"{plain[(index_zero + 3000) % length]}")
-    print(
-        "decrypted:",
-        plain[(index_zero + 1000) % length]
-        + plain[(index_zero + 2000) % length]
-        + plain[(index_zero + 3000) % length],
-    )
+    return get_plain()
+
+
+def mix_positions_numpy(cipher: list[int], runs: int) -> list[int]:
+    import numpy as np
+
+    length = len(cipher)
+    positions = np.arange(length, dtype=np.int64)
+
+    for _ in range(runs):
+        for i, shift in enumerate(cipher):
+            pos = int(positions[i])
+            new_pos = (pos + shift - 1) % (length - 1) + 1
+            # (same as mix_positions(), one masked add per move)
+            if new_pos > pos:
+                positions[(positions >= pos) & (positions <= new_pos)] -= 1
+            else:
+                positions[(positions >= new_pos) & (positions <= pos)] += 1
+            positions[i] = new_pos
+
+    plain = [0] * length
+    for c, pos in zip(cipher, positions.tolist()):
+        plain[pos] = c
+    return plain
+
+
+class BlockList:
+    """
+    The sequence of nodes 0..n-1 (in any order), split in blocks of about
+    `block_size` nodes, with each node pointing to its block. The sizes of
+    the blocks are kept in a Fenwick tree, so finding the index of a node,
+    removing it and inserting it are O(log(n / block_size)) steps in Python
+    plus O(block_size) list operations.
+    """
+
+    def __init__(self, n: int, block_size: int | None = None):
+        # (scanning a block for a node is what costs the most, so blocks
+        # stay around √n)
+        self.block_size = block_size or max(16, isqrt(n))
+        self._rebuild(range(n))
+
+    def _rebuild(self, nodes: Iterable[int]):
+        nodes = list(nodes)
+        size = self.block_size
+        self.blocks = [nodes[i : i + size] for i in range(0, len(nodes), size)]
+        self.block_of = [0] * len(nodes)
+        for b, block in enumerate(self.blocks):
+            for node in block:
+                self.block_of[node] = b
+        # Fenwick tree of the block sizes (1-based)
+        self._sizes = [0] * (len(self.blocks) + 1)
+        for b, block in enumerate(self.blocks):
+            self._add(b, len(block))
+
+    def _add(self, b: int, delta: int):
+        sizes = self._sizes
+        i = b + 1
+        while i < len(sizes):
+            sizes[i] += delta
+            i += i & -i
+
+    def _before(self, b: int) -> int:
+        # how many nodes are in the blocks before b
+        sizes = self._sizes
+        total = 0
+        while b:
+            total += sizes[b]
+            b -= b & -b
+        return total
+
+    def __iter__(self) -> Iterator[int]:
+        for block in self.blocks:
+            yield from block
+
+    def __len__(self) -> int:
+        return len(self.block_of)
+
+    def index(self, node: int) -> int:
+        b = self.block_of[node]
+        return self._before(b) + self.blocks[b].index(node)
+
+    def remove(self, node: int):
+        b = self.block_of[node]
+        self.blocks[b].remove(node)
+        self._add(b, -1)
+
+    def insert(self, index: int, node: int):
+        if not 0 <= index <= len(self):
+            raise IndexError("BlockList index out of range")
+        # the last block that starts before index (or the first one): an
+        # index right past the end of a block goes at the end of it
+        sizes = self._sizes
+        b = 0
+        step = 1 << (len(sizes) - 1).bit_length()
+        while step:
+            if b + step < len(sizes) and sizes[b + step] < index:
+                b += step
+                index -= sizes[b]
+            step >>= 1
+        block = self.blocks[b]
+        block.insert(index, node)
+        self.block_of[node] = b
+        self._add(b, 1)
+        if len(block) > 2 * self.block_size:
+            self._rebuild(self)
+
+
+def mix_blocks(cipher: list[int], runs: int) -> list[int]:
+    length = len(cipher)
+    order = BlockList(length)
+    for _ in range(runs):
+        for node, shift in enumerate(cipher):
+            pos = order.index(node)
+            order.remove(node)
+            # (the sequence is circular, and without the node there are
+            # length - 1 places to put it back)
+            order.insert((pos + shift) % (length - 1), node)
+    return [cipher[node] for node in order]
+
+
+MIXERS: dict[str, Callable[[list[int], int], list[int]]] = {
+    "blocks": mix_blocks,
+    "positions": mix_positions,
+    "numpy": mix_positions_numpy,
+}
 
 
 if __name__ == "__main__":
@@ -2,46 +2,43 @@
 https://adventofcode.com/2022/day/21
 """
 
-from collections import defaultdict
-from graphlib import TopologicalSorter
 from typing import IO
 
-from aoc import puzzle
+from aoc import puzzle, puzzle_option
+from monkeys import Program, Rule
 
 
 @puzzle
 def day21(input: IO[str]):
-    rules = {}
-    dag = defaultdict(set)
+    rules: dict[str, Rule] = {}
     for line in input:
         label, _, args = line.strip().partition(": ")
         match args.split():
             case (n,):
-                rules[label] = "const", int(n)
+                rules[label] = int(n)
             case operand1, op, operand2:
-                rules[label] = op, operand1, operand2
-                dag[label].add(operand1)
-                dag[label].add(operand2)
+                rules[label] = operand1, op, operand2
             case _:
                 raise ValueError
 
-    topo = TopologicalSorter(dag)
-    table = {}
-    for label in topo.static_order():
-        match rules[label]:
-            case "const", n:
-                table[label] = n
-            case "-", o1, o2:
-                table[label] = table[o1] - table[o2]
-            case "+", o1, o2:
-                table[label] = table[o1] + table[o2]
-            case "*", o1, o2:
-                table[label] = table[o1] * table[o2]
-            case "/", o1, o2:
-                assert table[o1] % table[o2] == 0
-                table[label] = table[o1] // table[o2]
-
-    print("part 1", table["root"])
+    program = Program(rules)
+    print("part 1", program["root"])
+
+    # "invert" walks down from root inverting operations, "linear" solves root
+    # as a linear equation in humn
+    if puzzle_option("DAY21_SOLVER", "invert", "linear") == "linear":
+        x = program.solve_linear("humn", "root")
+    else:
+        x = program.solve("humn", "root")
+    assert x.denominator == 1
+    humn = int(x)
+    print("part 2", humn)
+    # (only the monkeys between humn and root are re-evaluated)
+    program["humn"] = humn
+    root_rule = rules["root"]
+    assert isinstance(root_rule, tuple)
+    operand1, _, operand2 = root_rule
+    assert program[operand1] == program[operand2]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,211 @@
+"""
+Monkey math (day 21), compiled into integer-indexed opcodes.
+
+Every monkey gets an index, in topological order (the operands of a monkey
+come before it), and the rules become flat lists of opcodes and operand
+indices. Evaluating is then a single pass over the lists, and changing a
+number only re-evaluates the monkeys that depend on it.
+
+Numbers stay integers, unless a division isn't exact: they become
+fractions from there.
+"""
+
+from fractions import Fraction
+from graphlib import TopologicalSorter
+from heapq import heappop, heappush
+from typing import Iterable, NamedTuple
+
+# a number, or (operand1, op, operand2)
+Rule = int | tuple[str, str, str]
+Number = int | Fraction
+
+CONST, ADD, SUB, MUL, DIV = range(5)
+OPCODES = {"+": ADD, "-": SUB, "*": MUL, "/": DIV}
+
+
+def _apply(op: int, a: Number, b: Number) -> Number:
+    if op == ADD:
+        return a + b
+    if op == SUB:
+        return a - b
+    if op == MUL:
+        return a * b
+    q, r = divmod(a, b)
+    return Fraction(a, b) if r else q
+
+
+class Linear(NamedTuple):
+    """a·x + b, for some unknown x"""
+
+    a: Fraction
+    b: Fraction
+
+
+def _apply_linear(op: int, p: Linear, q: Linear) -> Linear:
+    if op == ADD:
+        return Linear(p.a + q.a, p.b + q.b)
+    if op == SUB:
+        return Linear(p.a - q.a, p.b - q.b)
+    if op == MUL:
+        if p.a and q.a:
+            raise ValueError("x * x isn't linear")
+        return Linear(p.a * q.b + q.a * p.b, p.b * q.b)
+    if q.a:
+        raise ValueError("dividing by x isn't linear")
+    return Linear(p.a / q.b, p.b / q.b)
+
+
+class Program:
+    def __init__(self, rules: dict[str, Rule]):
+        topo = TopologicalSorter(
+            {
+                label: rule[::2]
+                for label, rule in rules.items()
+                if isinstance(rule, tuple)
+            }
+        )
+        # (monkeys only yelling a number may not be in the graph at all)
+        order = [*topo.static_order()]
+        in_graph = set(order)
+        order += [label for label in rules if label not in in_graph]
+        self.labels = order
+        self.index = {label: i for i, label in enumerate(order)}
+
+        n = len(order)
+        self.ops = [CONST] * n
+        self.args1 = [0] * n
+        self.args2 = [0] * n
+        self.values: list[Number] = [0] * n
+        # the monkeys using each one as an operand
+        self.users: list[list[int]] = [[] for _ in range(n)]
+        for i, label in enumerate(order):
+            match rules[label]:
+                case int(number):
+                    self.values[i] = number
+                case operand1, op, operand2:
+                    a, b = self.index[operand1], self.index[operand2]
+                    self.ops[i] = OPCODES[op]
+                    self.args1[i] = a
+                    self.args2[i] = b
+                    self.users[a].append(i)
+                    self.users[b].append(i)
+                case rule:
+                    raise TypeError(f"{label}: not a rule: {rule!r}")
+        self.evaluate()
+
+    def evaluate(self):
+        values = self.values
+        for i, (op, a, b) in enumerate(zip(self.ops, self.args1, self.args2)):
+            if op != CONST:
+                values[i] = _apply(op, values[a], values[b])
+
+    def __getitem__(self, label: str) -> Number:
+        return self.values[self.index[label]]
+
+    def __setitem__(self, label: str, value: Number):
+        """Change the number of a monkey, and re-evaluate the ones using it"""
+        i = self.index[label]
+        if self.ops[i] != CONST:
+            raise ValueError(f"{label} doesn't yell a number")
+        self.values[i] = value
+        self._propagate([i])
+
+    def _propagate(self, changed: Iterable[int]):
+        # (monkeys are re-evaluated in topological order, each one once, and
+        # only as long as values actually change)
+        values, ops, args1, args2 = self.values, self.ops, self.args1, self.args2
+        pending: list[int] = []
+        queued = set()
+        for i in changed:
+            for user in self.users[i]:
+                if user not in queued:
+                    queued.add(user)
+                    heappush(pending, user)
+        while pending:
+            i = heappop(pending)
+            value = _apply(ops[i], values[args1[i]], values[args2[i]])
+            if value == values[i]:
+                continue
+            values[i] = value
+            for user in self.users[i]:
+                if user not in queued:
+                    queued.add(user)
+                    heappush(pending, user)
+
+    def path(self, label: str, to: str) -> list[int]:
+        """The monkeys from `to` down to `label`, which must be used once"""
+        start, end = self.index[label], self.index[to]
+        path = [start]
+        while path[-1] != end:
+            users = self.users[path[-1]]
+            if len(users) != 1:
+                raise ValueError(f"{self.labels[path[-1]]} isn't used exactly once")
+            path.append(users[0])
+        return path[::-1]
+
+    def solve(self, label: str, root: str) -> Number:
+        """The number `label` should yell for both operands of root to match.
+
+        Starting from root, what each monkey on the way down to `label`
+        must yell is found by inverting its operation, with the other
+        operand (which doesn't depend on `label`) as it is.
+        """
+        path = self.path(label, root)
+        values, ops, args1, args2 = self.values, self.ops, self.args1, self.args2
+        target = None
+        for i, next_i in zip(path, path[1:]):
+            a, b = args1[i], args2[i]
+            if target is None:
+                # root: both operands must be equal
+                target = values[b if next_i == a else a]
+                continue
+            op = ops[i]
+            if next_i == a:
+                other = values[b]
+                if op == ADD:
+                    target -= other
+                elif op == SUB:
+                    target += other
+                elif op == MUL:
+                    target = _apply(DIV, target, other)
+                else:
+                    target *= other
+            else:
+                other = values[a]
+                if op == ADD:
+                    target -= other
+                elif op == SUB:
+                    target = other - target
+                elif op == MUL:
+                    target = _apply(DIV, target, other)
+                else:
+                    target = _apply(DIV, other, target)
+        if target is None:
+            raise ValueError(f"{label} is {root}")
+        return target
+
+    def solve_linear(self, label: str, root: str) -> Fraction:
+        """The number `label` should yell for both operands of root to match.
+
+        Every monkey's number is evaluated, in one pass, as a linear form of
+        the number x that `label` yells, with exact rational coefficients:
+        root then makes a linear equation. Unlike solve(), `label` may be
+        used more than once, as long as it's never multiplied by itself or
+        a divisor.
+        """
+        x, end = self.index[label], self.index[root]
+        if self.ops[end] == CONST:
+            raise ValueError(f"{root} yells a number")
+        ops, args1, args2 = self.ops, self.args1, self.args2
+        forms: list[Linear] = []
+        for i, value in enumerate(self.values[:end]):
+            if i == x:
+                forms.append(Linear(Fraction(1), Fraction(0)))
+            elif ops[i] == CONST:
+                forms.append(Linear(Fraction(0), Fraction(value)))
+            else:
+                forms.append(_apply_linear(ops[i], forms[args1[i]], forms[args2[i]]))
+        p, q = forms[args1[end]], forms[args2[end]]
+        if p.a == q.a:
+            raise ValueError(f"{root} doesn't depend on {label}")
+        return (q.b - p.b) / (p.a - q.a)
@@ -0,0 +1,321 @@
+"""
+Sensors with a manhattan range (day 15), indexed for coverage queries.
+
+The range of a sensor is a diamond, which becomes a square in the rotated
+coordinates w = x + y, z = x - y (manhattan distance in XY is chebyshev
+distance in WZ). Sensors are indexed by their span of rows, and searched as
+squares in WZ, so each query only looks at the sensors that matter for it.
+"""
+
+from itertools import product
+from typing import (
+    TYPE_CHECKING,
+    Generic,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Sequence,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    import numpy
+
+Pos = tuple[int, int]
+Interval = tuple[int, int]
+# (w0, w1, z0, z1)
+Rect = tuple[int, int, int, int]
+
+# rectangles overlapping at most this many sensors are swept, not split
+SWEEP_SENSORS = 16
+
+# rows × sensors cells computed at once by coverage_by_row() (each temporary
+# array takes 8 bytes per cell)
+CHUNK_CELLS = 1 << 22
+
+T = TypeVar("T")
+
+
+class Sensor(NamedTuple):
+    x: int
+    y: int
+    radius: int
+
+    @property
+    def w(self) -> int:
+        return self.x + self.y
+
+    @property
+    def z(self) -> int:
+        return self.x - self.y
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> Iterator[Interval]:
+    """Merge sorted closed intervals, including the ones that only touch"""
+    intervals = iter(intervals)
+    try:
+        start, end = next(intervals)
+    except StopIteration:
+        return
+    for x0, x1 in intervals:
+        if x0 > end + 1:
+            yield start, end
+            start = x0
+            end = x1
+        elif x1 > end:
+            end = x1
+    yield start, end
+
+
+class _Node(NamedTuple, Generic[T]):
+    center: int
+    # the intervals containing center, by start and by end (descending)
+    by_start: Sequence[tuple[int, int, T]]
+    by_end: Sequence[tuple[int, int, T]]
+    left: "_Node[T] | None"
+    right: "_Node[T] | None"
+
+
+class IntervalTree(Generic[T]):
+    """Static (centered) interval tree of closed intervals"""
+
+    def __init__(self, intervals: Iterable[tuple[int, int, T]]):
+        self._root = self._build(list(intervals))
+
+    @classmethod
+    def _build(cls, intervals: list[tuple[int, int, T]]) -> _Node[T] | None:
+        if not intervals:
+            return None
+        endpoints = sorted(e for lo, hi, _ in intervals for e in (lo, hi))
+        center = endpoints[len(endpoints) // 2]
+        left = [i for i in intervals if i[1] < center]
+        right = [i for i in intervals if i[0] > center]
+        here = [i for i in intervals if i[0] <= center <= i[1]]
+        return _Node(
+            center,
+            sorted(here, key=lambda i: i[0]),
+            sorted(here, key=lambda i: -i[1]),
+            cls._build(left),
+            cls._build(right),
+        )
+
+    def stab(self, point: int) -> Iterator[T]:
+        """All the values of the intervals containing `point`"""
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for lo, _, value in node.by_start:
+                    if lo > point:
+                        break
+                    yield value
+                node = node.left
+            else:
+                for _, hi, value in node.by_end:
+                    if hi < point:
+                        break
+                    yield value
+                node = node.right
+
+
+class SensorIndex:
+    def __init__(self, sensors: Iterable[Sensor]):
+        self.sensors = list(sensors)
+        self._by_y = IntervalTree(
+            (s.y - s.radius, s.y + s.radius, s) for s in self.sensors
+        )
+        # ranges as squares in WZ
+        self._squares: list[Rect] = [
+            (s.w - s.radius, s.w + s.radius, s.z - s.radius, s.z + s.radius)
+            for s in self.sensors
+        ]
+
+    def row_coverage(self, y: int) -> list[Interval]:
+        """Covered intervals of x on row y, merged and sorted"""
+        segments = []
+        for s in self._by_y.stab(y):
+            dx = s.radius - abs(s.y - y)
+            segments.append((s.x - dx, s.x + dx))
+        segments.sort()
+        return list(merge_intervals(segments))
+
+    def covers(self, x: int, y: int) -> bool:
+        return any(
+            abs(s.x - x) + abs(s.y - y) <= s.radius for s in self._by_y.stab(y)
+        )
+
+    def find_gap(self, xs: range, ys: range) -> Pos | None:
+        """An uncovered point of the box xs × ys, if there is one.
+
+        A single gap enclosed by sensors is right outside their ranges, on
+        lines running between two of them, one line of each direction. So
+        only the intersections of lines that are right past the end of a
+        sensor's range and right before the start of another one's are
+        checked. Any other kind of gap (e.g. on the border of the box) is
+        left to uncovered().
+        """
+        x0, x1 = xs[0], xs[-1]
+        y0, y1 = ys[0], ys[-1]
+        shared_ws = _lines_between(
+            [(s.w - s.radius, s.w + s.radius) for s in self.sensors],
+            range(x0 + y0, x1 + y1 + 1),
+        )
+        shared_zs = _lines_between(
+            [(s.z - s.radius, s.z + s.radius) for s in self.sensors],
+            range(x0 - y1, x1 - y0 + 1),
+        )
+        # (each check costs about as much as searching around a few sensors,
+        # so with too many lines searching is faster; with few sensors, as in
+        # the example, a few dozen checks are still cheaper)
+        if len(shared_ws) * len(shared_zs) > max(64, len(self.sensors) // 8):
+            return next(self.uncovered(xs, ys), None)
+        for w, z in product(shared_ws, shared_zs):
+            if (w - z) % 2:
+                continue
+            x, y = (w + z) // 2, (w - z) // 2
+            if x in xs and y in ys and not self.covers(x, y):
+                return x, y
+        return next(self.uncovered(xs, ys), None)
+
+    def uncovered(self, xs: range, ys: range) -> Iterator[Pos]:
+        """Points of the box xs × ys not covered by any sensor.
+
+        The box is split in WZ into smaller and smaller rectangles, each with
+        the sensors overlapping it, until a single sensor covers it or only
+        a few are left, and those are swept (see _sweep()): only the edges of
+        the covered area are explored in detail.
+        """
+        x0, x1 = xs[0], xs[-1]
+        y0, y1 = ys[0], ys[-1]
+        box: Rect = (x0 + y0, x1 + y1, x0 - y1, x1 - y0)
+        stack = [(box, self._squares)]
+        while stack:
+            rect, squares = stack.pop()
+            wa, wb, za, zb = rect
+            # (corners of the rectangle aren't points of the box, only the
+            # parts of it between these lines are)
+            if (
+                (wb + zb) // 2 < x0
+                or (wa + za + 1) // 2 > x1
+                or (wb - za) // 2 < y0
+                or (wa - zb + 1) // 2 > y1
+            ):
+                continue
+            squares = [
+                (w0, w1, z0, z1)
+                for w0, w1, z0, z1 in squares
+                if w0 <= wb and wa <= w1 and z0 <= zb and za <= z1
+            ]
+            if any(
+                w0 <= wa and wb <= w1 and z0 <= za and zb <= z1
+                for w0, w1, z0, z1 in squares
+            ):
+                continue
+            if len(squares) <= SWEEP_SENSORS:
+                for gap in _sweep(rect, squares):
+                    yield from _points_in(gap, x0, x1, y0, y1)
+                continue
+            # split along the longest side
+            if wb - wa >= zb - za:
+                mid = (wa + wb) // 2
+                stack.append(((mid + 1, wb, za, zb), squares))
+                stack.append(((wa, mid, za, zb), squares))
+            else:
+                mid = (za + zb) // 2
+                stack.append(((wa, wb, mid + 1, zb), squares))
+                stack.append(((wa, wb, za, mid), squares))
+
+
+def _lines_between(spans: Sequence[Interval], within: range) -> list[int]:
+    # the lines right past the end of a span and right before the start of
+    # another, within the given range
+    past_end = {hi + 1 for _, hi in spans if hi + 1 in within}
+    return sorted(past_end.intersection(lo - 1 for lo, _ in spans))
+
+
+def _sweep(rect: Rect, squares: Sequence[Rect]) -> Iterator[Rect]:
+    # the parts of rect not covered by the squares, as rectangles: split in
+    # strips along w where the same squares are active, then along z
+    wa, wb, za, zb = rect
+    bounds = sorted(
+        {wa, wb + 1}
+        | {w for w0, w1, _, _ in squares for w in (w0, w1 + 1) if wa < w <= wb}
+    )
+    for w0, w1 in zip(bounds, bounds[1:]):
+        z = za
+        covered = sorted((z0, z1) for s0, s1, z0, z1 in squares if s0 <= w0 <= s1)
+        for z0, z1 in merge_intervals(covered):
+            if z0 > z:
+                yield w0, w1 - 1, z, min(z0 - 1, zb)
+            z = max(z, z1 + 1)
+            if z > zb:
+                break
+        if z <= zb:
+            yield w0, w1 - 1, z, zb
+
+
+def _points_in(rect: Rect, x0: int, x1: int, y0: int, y1: int) -> Iterator[Pos]:
+    # points of the rectangle in WZ that are in the box [x0, x1] × [y0, y1]
+    wa, wb, za, zb = rect
+    # (only the w where the rectangle reaches into the box)
+    first_w = max(wa, x0 + y0, za + 2 * y0, 2 * x0 - zb)
+    last_w = min(wb, x1 + y1, 2 * x1 - za, zb + 2 * y1)
+    for w in range(first_w, last_w + 1):
+        z_first = max(za, 2 * x0 - w, w - 2 * y1)
+        z_last = min(zb, 2 * x1 - w, w - 2 * y0)
+        # only the points where w and z have the same parity
+        z_first += (z_first - w) % 2
+        for z in range(z_first, z_last + 1, 2):
+            yield (w + z) // 2, (w - z) // 2
+
+
+def coverage_by_row(
+    sensors: Sequence[Sensor], ys: range, xs: range, chunk_size: int | None = None
+) -> tuple["numpy.ndarray", "numpy.ndarray"]:
+    """Covered cells and the first gap of every row in ys, within xs.
+
+    Returns two arrays with one entry per row: how many cells of xs are
+    covered, and the first x of xs that isn't (or xs[-1] + 1 for none).
+    Needs numpy: all the rows of a chunk are computed at once, by default as
+    many as fit in CHUNK_CELLS cells.
+    """
+    import numpy as np
+
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_CELLS // max(1, len(sensors)))
+
+    x0, x1 = xs[0], xs[-1]
+    sx = np.array([s.x for s in sensors], dtype=np.int64)
+    sy = np.array([s.y for s in sensors], dtype=np.int64)
+    radius = np.array([s.radius for s in sensors], dtype=np.int64)
+
+    covered = np.empty(len(ys), dtype=np.int64)
+    gaps = np.empty(len(ys), dtype=np.int64)
+    for start in range(0, len(ys), chunk_size):
+        rows = np.arange(ys[start], ys[min(start + chunk_size, len(ys)) - 1] + 1)
+        half = radius - np.abs(rows[:, None] - sy)
+        lo = np.maximum(sx - half, x0)
+        hi = np.minimum(sx + half, x1)
+        # rows out of a sensor's reach become empty intervals past the end,
+        # and one more per row, even further, stands for the end itself
+        empty = (half < 0) | (lo > hi)
+        lo[empty] = x1 + 1
+        hi[empty] = x1
+        lo = np.pad(lo, ((0, 0), (0, 1)), constant_values=x1 + 2)
+        hi = np.pad(hi, ((0, 0), (0, 1)), constant_values=x1)
+
+        order = np.argsort(lo, axis=1)
+        lo = np.take_along_axis(lo, order, axis=1)
+        hi = np.take_along_axis(hi, order, axis=1)
+        # how far the intervals before each one reach
+        reach = np.maximum.accumulate(hi, axis=1)
+        before = np.empty_like(reach)
+        before[:, 0] = x0 - 1
+        before[:, 1:] = reach[:, :-1]
+
+        # each interval only adds what's past the ones before it
+        added = np.clip(hi - np.maximum(lo, before + 1) + 1, 0, None)
+        covered[start : start + len(rows)] = added.sum(axis=1)
+        # (the end always looks like a gap, at x1 + 1 if the row is covered)
+        first_gap = np.argmax(lo > before + 1, axis=1)
+        gaps[start : start + len(rows)] = before[np.arange(len(rows)), first_gap] + 1
+    return covered, gaps